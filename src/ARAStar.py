@@ -0,0 +1,141 @@
+import heapq
+import time
+
+from CostMap import octile_distance
+
+INFINITY = float('inf')
+
+
+class ARAStar(object):
+    """
+    Anytime Repairing A*. The first search inflates the heuristic so it finds
+    a path quickly, at most initial_weight times longer than the best one.
+    While time remains the weight is lowered and the search is repaired
+    rather than restarted, each time giving a path at least as good as the
+    last, until the weight reaches 1 and the path is optimal.
+    """
+
+    def __init__(self, costMap, start_x, start_y, goal_x, goal_y, initial_weight=3.0, weight_step=0.5):
+        """
+        :param costMap: The CostMap to plan on.
+        :param start_x: The starting X cell on the map.
+        :param start_y: The starting Y cell on the map.
+        :param goal_x: The goal X cell on the map.
+        :param goal_y: The goal Y cell on the map.
+        :param initial_weight: The heuristic weight of the first search.
+        :param weight_step: How much the weight drops between searches.
+        """
+        self.costMap = costMap
+        self.empty = costMap.empty.ravel()
+        self.goal_x = goal_x
+        self.goal_y = goal_y
+        self.start = costMap.index(start_x, start_y)
+        self.goal = costMap.index(goal_x, goal_y)
+        self.weight = initial_weight
+        self.weight_step = weight_step
+        self.g = {self.start: 0}
+        self.parents = {self.start: None}
+        self.h = {}
+        # Cells waiting to be expanded, and their heap of (F value, insertion order, cell)
+        self.open_set = set([self.start])
+        self.open_heap = [(self._fvalue(self.start), 0, self.start)]
+        # Cells expanded in this search, and cells that improved after being expanded
+        self.closed = set()
+        self.incons = set()
+        self.counter = 0
+        self.expansions = 0
+
+    def run(self, time_budget, on_solution=None):
+        """
+        Plan until the path is optimal or the time budget runs out. The first
+        search always runs to the end, so a path is found if one exists even
+        when it takes longer than the budget.
+        :param time_budget: The seconds to spend improving the path.
+        :param on_solution: Optional callable taking (path, weight), called
+        each time a path cheaper than the last one is found.
+        :return: A tuple of the best path, a list of cell indices from the cell
+        after the start to the goal or None if there is no path, and the
+        weight it was found with, i.e. how far from optimal it can be.
+        """
+        deadline = time.time() + time_budget
+        best_path, best_cost, best_weight = None, INFINITY, None
+        first = True
+        while True:
+            if not self._improve_path(None if first else deadline):
+                break
+            first = False
+            cost = self.g.get(self.goal, INFINITY)
+            if cost == INFINITY:
+                break
+            if cost < best_cost:
+                best_path, best_cost = self._extract_path(), cost
+                if on_solution is not None:
+                    on_solution(best_path, self.weight)
+            best_weight = self.weight
+            if self.weight <= 1.0 or time.time() >= deadline:
+                break
+
+            # Lower the weight and repair the search with the cells that improved after being closed
+            self.weight = max(1.0, self.weight - self.weight_step)
+            self.open_set |= self.incons
+            self.incons = set()
+            self.closed = set()
+            self.open_heap = []
+            for s in self.open_set:
+                self.counter += 1
+                self.open_heap.append((self._fvalue(s), self.counter, s))
+            heapq.heapify(self.open_heap)
+        return best_path, best_weight
+
+    def _heuristic(self, s):
+        h = self.h.get(s)
+        if h is None:
+            width = self.costMap.width
+            h = self.h[s] = octile_distance(s % width, s // width, self.goal_x, self.goal_y)
+        return h
+
+    def _fvalue(self, s):
+        return self.g[s] + self.weight * self._heuristic(s)
+
+    def _improve_path(self, deadline):
+        """
+        Expand cells until no open cell could lead to a cheaper path to the goal.
+        :param deadline: The time to give up at, or None to never give up.
+        :return: False if the deadline passed first.
+        """
+        while self.open_heap:
+            f, order, s = self.open_heap[0]
+            if s not in self.open_set or f != self._fvalue(s):
+                heapq.heappop(self.open_heap)
+                continue
+            if self.g.get(self.goal, INFINITY) <= f:
+                return True
+            if deadline is not None and self.expansions % 100 == 0 and time.time() >= deadline:
+                return False
+            heapq.heappop(self.open_heap)
+            self.open_set.remove(s)
+            self.closed.add(s)
+            self.expansions += 1
+            g_val = self.g[s]
+            for n, cost in self.costMap.neighbors(s):
+                if not self.empty[n]:
+                    continue
+                if g_val + cost < self.g.get(n, INFINITY):
+                    self.g[n] = g_val + cost
+                    self.parents[n] = s
+                    if n in self.closed:
+                        self.incons.add(n)
+                    else:
+                        self.open_set.add(n)
+                        self.counter += 1
+                        heapq.heappush(self.open_heap, (self._fvalue(n), self.counter, n))
+        return True
+
+    def _extract_path(self):
+        path = []
+        current = self.goal
+        while current != self.start:
+            path.append(current)
+            current = self.parents[current]
+        path.reverse()
+        return path
@@ -0,0 +1,107 @@
+import heapq
+
+from CostMap import G_UNSET, NEIGHBOR_OFFSETS, octile_distance
+
+
+def astar_search(costMap, start_x, start_y, goal_x, goal_y, progress=None, progress_every=0):
+    """
+    A* on a CostMap. The open list is a binary heap with lazy deletion, and
+    cells are closed in a flat bitmap indexed by y * width + x, so membership
+    checks are O(1). G values and parents are kept in the costMap's planner
+    arrays, so concurrent searches need their own CostMap.
+    :param costMap: The CostMap to plan on.
+    :param start_x: The starting X cell on the map.
+    :param start_y: The starting Y cell on the map.
+    :param goal_x: The goal X cell on the map.
+    :param goal_y: The goal Y cell on the map.
+    :param progress: Optional callable taking (opened, closed, final), lists
+    of the cell indices opened and closed since it last returned True. It is
+    offered the search progress every progress_every expansions, and once
+    more with final set when the search ends.
+    :param progress_every: How many expansions between progress calls.
+    :return: A tuple of the path, a list of cell indices from the cell after
+    the start to the goal or None if there is no path, and the number of
+    cells expanded.
+    """
+    width = costMap.width
+    height = costMap.height
+    empty = costMap.empty.ravel()
+    g = costMap.g
+    h = costMap.h
+    parent = costMap.parent
+
+    # Heap of (F value, insertion order, cell index); stale entries are skipped when popped
+    open_heap = []
+    # Cells that have already been expanded, by cell index
+    closed = bytearray(width * height)
+    expansions = 0
+    counter = 0
+    # Cells opened and closed since progress last took them
+    opened_since = []
+    closed_since = []
+
+    # H values are computed lazily as cells are reached, not swept over the whole map
+    costMap.reset_search()
+
+    start = start_y * width + start_x
+    goal = goal_y * width + goal_x
+    g[start] = 0
+    h[start] = octile_distance(start_x, start_y, goal_x, goal_y)
+    heapq.heappush(open_heap, (int(h[start]), counter, start))
+
+    selected = None
+    while open_heap:
+        selected = heapq.heappop(open_heap)[2]
+        if closed[selected]:
+            continue
+        closed[selected] = 1
+        expansions += 1
+        if progress is not None:
+            closed_since.append(selected)
+        if selected == goal:
+            break
+
+        x_pos = selected % width
+        y_pos = selected // width
+        g_val = int(g[selected])
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx = x_pos + dx
+            ny = y_pos + dy
+            if nx < 0 or ny < 0 or nx >= width or ny >= height:
+                continue
+            n = ny * width + nx
+            if closed[n] or not empty[n]:
+                continue
+            # moving like a rook costs 10, moving like a bishop costs 14 because 10 * sqrt(2) = ~14
+            if dx == 0 or dy == 0:
+                tentative = g_val + 10
+            else:
+                tentative = g_val + 14
+            g_old = g[n]
+            if tentative < g_old:
+                if g_old == G_UNSET:
+                    h[n] = octile_distance(nx, ny, goal_x, goal_y)
+                g[n] = tentative
+                parent[n] = selected
+                counter += 1
+                heapq.heappush(open_heap, (tentative + int(h[n]), counter, n))
+                if progress is not None:
+                    opened_since.append(n)
+
+        if progress is not None and expansions % progress_every == 0:
+            if progress(opened_since, closed_since, False):
+                opened_since = []
+                closed_since = []
+
+    if progress is not None:
+        progress(opened_since, closed_since, True)
+
+    if selected != goal:
+        return None, expansions
+
+    path = []
+    while selected != start:
+        path.append(selected)
+        selected = int(parent[selected])
+    path.reverse()
+    return path, expansions
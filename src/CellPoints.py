@@ -0,0 +1,53 @@
+import numpy
+
+
+class CellPoints(object):
+    """
+    Builds the points at the centers of the cells of a mask of the grid, all
+    cells at once, e.g. for a GridCells message. The points of the last mask
+    are kept, and while the map geometry and size stay the same only the
+    cells that weren't in it get new points, so an unchanged wall set isn't
+    rebuilt on every map.
+    """
+
+    def __init__(self, make_point=None):
+        """
+        :param make_point: A callable taking the world X and Y of a cell center
+        and returning its point, e.g. a geometry_msgs Point. By default the
+        points are (x, y) tuples.
+        """
+        self.make_point = make_point or (lambda x, y: (x, y))
+        self.indices = numpy.zeros(0, dtype=numpy.intp)
+        self.geometry = None
+        self.shape = None
+        self.points = []
+
+    def update(self, mask, geometry):
+        """
+        :param mask: A (height, width) boolean array of the cells to include.
+        :param geometry: The MapGeometry of the map the mask covers.
+        :return: A list of the points at the centers of the masked cells, in row-major order.
+        """
+        indices = numpy.flatnonzero(mask)
+        # Flat indices only name the same cells while the map keeps its size
+        same_map = geometry == self.geometry and mask.shape == self.shape
+        if same_map and numpy.array_equal(indices, self.indices):
+            return self.points
+        points = [None] * len(indices)
+        if same_map and len(self.indices):
+            # Both index arrays are sorted, so each cell's old point is found by a binary search
+            positions = numpy.minimum(numpy.searchsorted(self.indices, indices), len(self.indices) - 1)
+            kept = self.indices[positions] == indices
+            for i, position in zip(numpy.flatnonzero(kept).tolist(), positions[kept].tolist()):
+                points[i] = self.points[position]
+            new = numpy.flatnonzero(~kept)
+        else:
+            new = numpy.arange(len(indices))
+        world_x, world_y = geometry.to_world(indices[new] % mask.shape[1], indices[new] // mask.shape[1])
+        for i, x, y in zip(new.tolist(), world_x.tolist(), world_y.tolist()):
+            points[i] = self.make_point(x, y)
+        self.points = points
+        self.indices = indices
+        self.geometry = geometry
+        self.shape = mask.shape
+        return points
@@ -0,0 +1,460 @@
+import heapq
+
+import numpy
+
+from Region import Region
+
+# Largest G value, used to mark cells the planner has not reached yet
+G_UNSET = numpy.iinfo(numpy.int32).max
+
+# Grid offsets of the 8-connected neighbors of a cell
+NEIGHBOR_OFFSETS = [(1, 0), (0, 1), (-1, 0), (0, -1), (-1, -1), (1, 1), (-1, 1), (1, -1)]
+
+
+def octile_distance(x, y, goal_x, goal_y):
+    """
+    The octile distance between two cells using the planner's move costs of
+    10 for a straight move and 14 for a diagonal one. It never overestimates
+    the true path cost, so it is an admissible A* heuristic.
+    :param x: The X grid position.
+    :param y: The Y grid position.
+    :param goal_x: The goal X position on the grid.
+    :param goal_y: The goal Y position on the grid.
+    :return: The octile distance.
+    """
+    dx = abs(goal_x - x)
+    dy = abs(goal_y - y)
+    if dx > dy:
+        return 10 * dx + 4 * dy
+    return 10 * dy + 4 * dx
+
+
+class CostMap(object):
+    """
+    An occupancy grid stored in contiguous numpy arrays instead of one
+    GridCell object per cell. All arrays are row-major like OccupancyGrid.data,
+    so cell (x, y) lives at flat index y * width + x.
+    """
+
+    def __init__(self, width, height, data):
+        """
+        Build the grid from row-major occupancy data in one bulk conversion.
+        :param width: The width of the map in cells.
+        :param height: The height of the map in cells.
+        :param data: The occupancy data, e.g. OccupancyGrid.data.
+        """
+        self.width = width
+        self.height = height
+        self.occupancy = numpy.array(data, dtype=numpy.int8).reshape(height, width)
+        # A fresh map counts cells at or below 30 as empty, the same as GridCell
+        self.empty = self.occupancy <= 30
+        self.unknown = self.occupancy < 0
+
+        # Planner state, indexed by flat cell index
+        size = width * height
+        self.g = numpy.zeros(size, dtype=numpy.int32)
+        self.h = numpy.zeros(size, dtype=numpy.int32)
+        self.parent = numpy.full(size, -1, dtype=numpy.int32)
+
+    def index(self, x, y):
+        """
+        Get the flat array index of a cell.
+        :param x: The X grid position.
+        :param y: The Y grid position.
+        :return: The index into the flattened arrays.
+        """
+        return y * self.width + x
+
+    def in_bounds(self, x, y):
+        """
+        Determine if a grid position lies on the map.
+        :param x: The X grid position.
+        :param y: The Y grid position.
+        :return: True if the position is on the map.
+        """
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def neighbors(self, index):
+        """
+        Get the on-map 8-connected neighbors of a cell and the cost of moving
+        to each, 10 for a straight move and 14 for a diagonal one.
+        :param index: The flat index of the cell.
+        :return: A list of (neighbor index, move cost) tuples.
+        """
+        x = index % self.width
+        y = index // self.width
+        neighbors = []
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx = x + dx
+            ny = y + dy
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                neighbors.append((ny * self.width + nx, 10 if dx == 0 or dy == 0 else 14))
+        return neighbors
+
+    def set_occupancy(self, x, y, occupancy_level):
+        """
+        Set the occupancy level of a single cell and update its masks.
+        :param x: The X grid position.
+        :param y: The Y grid position.
+        :param occupancy_level: The new occupancy level.
+        """
+        self.occupancy[y, x] = occupancy_level
+        # Updated cells count as empty at or below 50, the same as GridCell
+        self.empty[y, x] = occupancy_level <= 50
+        self.unknown[y, x] = occupancy_level < 0
+
+    def write_patch(self, data, patch_width, patch_height, patch_geometry, geometry):
+        """
+        Write a patch of occupancy data, e.g. a local costmap, onto the map in
+        one bulk slice. The patch may lie partly or wholly off the map, may be
+        offset from the map's cells and may have a different resolution. Each
+        map cell takes the highest level of the patch cells centered in it, or
+        when the patch is coarser, the level of the patch cell over its center.
+        Written cells count as empty at or below 50, the same as set_occupancy.
+        :param data: The patch's row-major occupancy data, e.g. OccupancyGrid.data.
+        :param patch_width: The width of the patch in cells.
+        :param patch_height: The height of the patch in cells.
+        :param patch_geometry: The MapGeometry of the patch, in the map's frame.
+        :param geometry: The MapGeometry of this map.
+        :return: A tuple of the Region written, or None if the patch missed the
+        map, and an array of the flat indices of the cells whose empty status changed.
+        """
+        patch = numpy.array(data, dtype=numpy.int8).reshape(patch_height, patch_width)
+        if patch_geometry.resolution <= geometry.resolution:
+            columns = _cells_under(patch_geometry.origin_x, patch_geometry.resolution, patch_width,
+                                   geometry.origin_x, geometry.resolution)
+            rows = _cells_under(patch_geometry.origin_y, patch_geometry.resolution, patch_height,
+                                geometry.origin_y, geometry.resolution)
+            on_x = (columns >= 0) & (columns < self.width)
+            on_y = (rows >= 0) & (rows < self.height)
+            if not on_x.any() or not on_y.any():
+                return None, numpy.zeros(0, dtype=numpy.intp)
+            patch, columns, rows = patch[on_y][:, on_x], columns[on_x], rows[on_y]
+            # Patch cells are no wider than map cells, so the map cells they land in are consecutive
+            region = Region(int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1)
+            first_columns = numpy.flatnonzero(numpy.concatenate(([True], columns[1:] != columns[:-1])))
+            first_rows = numpy.flatnonzero(numpy.concatenate(([True], rows[1:] != rows[:-1])))
+            levels = numpy.maximum.reduceat(numpy.maximum.reduceat(patch, first_rows, axis=0), first_columns, axis=1)
+        else:
+            # The patch is coarser, so sample the patch cell over the center of each map cell it covers
+            columns = _cells_under(geometry.origin_x, geometry.resolution, self.width,
+                                   patch_geometry.origin_x, patch_geometry.resolution)
+            rows = _cells_under(geometry.origin_y, geometry.resolution, self.height,
+                                patch_geometry.origin_y, patch_geometry.resolution)
+            on_x = numpy.flatnonzero((columns >= 0) & (columns < patch_width))
+            on_y = numpy.flatnonzero((rows >= 0) & (rows < patch_height))
+            if not len(on_x) or not len(on_y):
+                return None, numpy.zeros(0, dtype=numpy.intp)
+            region = Region(int(on_x[0]), int(on_y[0]), int(on_x[-1]) + 1, int(on_y[-1]) + 1)
+            levels = patch[rows[on_y]][:, columns[on_x]]
+
+        was_empty = self.empty[region.slices].copy()
+        self.occupancy[region.slices] = levels
+        self.empty[region.slices] = levels <= 50
+        self.unknown[region.slices] = levels < 0
+        changed_y, changed_x = numpy.nonzero(was_empty != self.empty[region.slices])
+        return region, (changed_y + region.y0) * self.width + changed_x + region.x0
+
+    def path_distances(self, start_x, start_y, targets, escape_level=None):
+        """
+        Find the path cost from a start cell to several target cells with a
+        single Dijkstra expansion, which stops once every target is reached.
+        Moves only go into known empty cells, so a target is only reached
+        through explored space, not through unknown cells behind a wall.
+        :param start_x: The starting X cell on the map.
+        :param start_y: The starting Y cell on the map.
+        :param targets: A list of flat indices of the target cells.
+        :param escape_level: If given and the start is not known empty, e.g.
+        inside an inflated obstacle, the path may first leave it through cells
+        with an occupancy level at or below this, to the closest known empty cells.
+        :return: A list with the path cost to each target, 10 per straight
+        move and 14 per diagonal one, or None where a target is unreachable.
+        """
+        if not self.in_bounds(start_x, start_y):
+            return [None] * len(targets)
+        free = (self.empty & ~self.unknown).ravel()
+        start = self.index(start_x, start_y)
+        if escape_level is not None and not free[start]:
+            open_heap = self.closest_empty(start, escape_level)
+        else:
+            open_heap = [(0, start)]
+        distances = dict((current, dist) for dist, current in open_heap)
+        heapq.heapify(open_heap)
+        done = bytearray(self.width * self.height)
+        remaining = set(targets)
+        remaining.discard(start)
+        while open_heap and remaining:
+            dist, current = heapq.heappop(open_heap)
+            if done[current]:
+                continue
+            done[current] = 1
+            remaining.discard(current)
+            for n, cost in self.neighbors(current):
+                if done[n] or not free[n]:
+                    continue
+                if dist + cost < distances.get(n, G_UNSET):
+                    distances[n] = dist + cost
+                    heapq.heappush(open_heap, (dist + cost, n))
+        return [0 if target == start else distances[target] if done[target] else None for target in targets]
+
+    def closest_empty(self, start, escape_level):
+        """
+        Find the known empty cells closest to a cell that isn't one, moving
+        only through cells with an occupancy level at or below escape_level.
+        The search stops at the first known empty cells it reaches, so it
+        can't follow an inflated band or unknown space to cells further along it.
+        :param start: The flat index of the cell.
+        :param escape_level: The highest occupancy level that may be crossed.
+        :return: A list of (path cost, flat index) tuples of the closest known
+        empty cells, all with the same cost, or an empty list if there are none.
+        """
+        free = (self.empty & ~self.unknown).ravel()
+        occupancy = self.occupancy.ravel()
+        distances = {start: 0}
+        done = set()
+        found = []
+        open_heap = [(0, start)]
+        while open_heap:
+            dist, current = heapq.heappop(open_heap)
+            if found and dist > found[0][0]:
+                break
+            if current in done:
+                continue
+            done.add(current)
+            if free[current]:
+                found.append((dist, current))
+                continue
+            for n, cost in self.neighbors(current):
+                if n in done or (not free[n] and occupancy[n] > escape_level):
+                    continue
+                if dist + cost < distances.get(n, G_UNSET):
+                    distances[n] = dist + cost
+                    heapq.heappush(open_heap, (dist + cost, n))
+        return found
+
+    def changed_cells(self, other):
+        """
+        Find the cells whose empty status differs between two maps of the same size.
+        :param other: Another CostMap.
+        :return: An array of flat cell indices, or None if the maps differ in size.
+        """
+        if self.occupancy.shape != other.occupancy.shape:
+            return None
+        return numpy.flatnonzero(self.empty != other.empty)
+
+    def reset_search(self):
+        """
+        Clear the planner state before a new search.
+        """
+        self.g.fill(G_UNSET)
+        self.parent.fill(-1)
+
+    def copy(self):
+        """
+        Copy the map with fresh planner state, so a search can run on it while
+        the original keeps changing.
+        :return: A new CostMap.
+        """
+        other = CostMap(self.width, self.height, self.occupancy)
+        other.empty[:] = self.empty
+        other.unknown[:] = self.unknown
+        return other
+
+    def cells(self, indices):
+        """
+        Get GridCell-compatible views of several cells.
+        :param indices: An iterable of flat cell indices.
+        :return: A list of MapCells.
+        """
+        return [MapCell(self, index % self.width, index // self.width) for index in indices]
+
+    def cell(self, x, y):
+        """
+        Get a GridCell-compatible view of a cell.
+        :param x: The X grid position.
+        :param y: The Y grid position.
+        :return: A MapCell backed by this map's arrays.
+        """
+        return MapCell(self, x, y)
+
+    def __getitem__(self, x):
+        """
+        Index the map like the old list-of-lists costMap, i.e. costMap[x][y].
+        :param x: The X grid position.
+        :return: A column of the map.
+        """
+        if x < 0:
+            x += self.width
+        if not 0 <= x < self.width:
+            raise IndexError('map column out of range')
+        return _MapColumn(self, x)
+
+    def __len__(self):
+        return self.width
+
+    def __iter__(self):
+        for x in range(self.width):
+            yield _MapColumn(self, x)
+
+
+def _cells_under(origin, resolution, count, other_origin, other_resolution):
+    """
+    Find which cells of one grid lie under the centers of a row of cells of another.
+    :param origin: The world coordinate of the corner of the row.
+    :param resolution: The size of a cell of the row.
+    :param count: The number of cells in the row.
+    :param other_origin: The world coordinate of the corner of the other grid.
+    :param other_resolution: The size of a cell of the other grid.
+    :return: An array of the other grid's cell positions, one for each cell of the row.
+    """
+    centers = origin + (numpy.arange(count) + 0.5) * resolution
+    return numpy.floor((centers - other_origin) / other_resolution).astype(numpy.intp)
+
+
+class _MapColumn(object):
+    """
+    A single column of a CostMap, returned by costMap[x].
+    """
+    __slots__ = ('costMap', 'x')
+
+    def __init__(self, costMap, x):
+        self.costMap = costMap
+        self.x = x
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.costMap.height
+        if not 0 <= y < self.costMap.height:
+            raise IndexError('map row out of range')
+        return MapCell(self.costMap, self.x, y)
+
+    def __len__(self):
+        return self.costMap.height
+
+    def __iter__(self):
+        for y in range(self.costMap.height):
+            yield MapCell(self.costMap, self.x, y)
+
+
+class MapCell(object):
+    """
+    A GridCell-compatible view of one cell of a CostMap. Views are cheap to
+    create and hold no state of their own, so two views of the same position
+    compare equal.
+    """
+    __slots__ = ('costMap', 'Xpos', 'Ypos')
+
+    def __init__(self, costMap, x, y):
+        self.costMap = costMap
+        self.Xpos = x
+        self.Ypos = y
+
+    def _index(self):
+        return self.Ypos * self.costMap.width + self.Xpos
+
+    def setH(self, goalX, goalY):
+        """
+        sets the H value to the octile distance to the goal
+        :param goalX: The goal X position on the grid.
+        :param goalY: The goal Y position on the grid.
+        """
+        self.costMap.h[self._index()] = octile_distance(self.Xpos, self.Ypos, goalX, goalY)
+
+    def setParent(self, parentCell):
+        """
+        sets the parent of the cell and also the G value, 10 for a straight
+        move and 14 for a diagonal one
+        :param parentCell: The parent cell to this cell.
+        """
+        index = self._index()
+        self.costMap.parent[index] = parentCell.getYpos() * self.costMap.width + parentCell.getXpos()
+        if self.Xpos == parentCell.getXpos() or self.Ypos == parentCell.getYpos():
+            self.costMap.g[index] = parentCell.getGval() + 10
+        else:
+            self.costMap.g[index] = parentCell.getGval() + 14
+
+    def isNotInList(self, theList):
+        for cell in theList:
+            if cell.getXpos() == self.Xpos and cell.getYpos() == self.Ypos:
+                return False
+        return True
+
+    def isEmpty(self):
+        """
+        Determine if the cell is empty.
+        :return: True if empty.
+        """
+        return bool(self.costMap.empty[self.Ypos, self.Xpos])
+
+    def getXpos(self):
+        """
+        Get the X grid position of the cell.
+        :return: The grid position.
+        """
+        return self.Xpos
+
+    def getYpos(self):
+        """
+        Get the Y grid position of the cell.
+        :return: The grid position.
+        """
+        return self.Ypos
+
+    def getGval(self):
+        return int(self.costMap.g[self._index()])
+
+    def getHval(self):
+        """
+        Get the cell's H value.
+        :return: The H value.
+        """
+        return int(self.costMap.h[self._index()])
+
+    def getFval(self):
+        """
+        Get the cell's F value.
+        :return: The F value.
+        """
+        return self.getGval() + self.getHval()
+
+    def getParent(self):
+        """
+        Get the cell's parent.
+        :return: A MapCell, the parent cell, or None if it has no parent.
+        """
+        parent = int(self.costMap.parent[self._index()])
+        if parent < 0:
+            return None
+        return MapCell(self.costMap, parent % self.costMap.width, parent // self.costMap.width)
+
+    def getOccupancyLevel(self):
+        """
+        Get the cell's occupancy level.
+        :return: An int from 0 to 100.
+        """
+        return int(self.costMap.occupancy[self.Ypos, self.Xpos])
+
+    def isUnknown(self):
+        return bool(self.costMap.unknown[self.Ypos, self.Xpos])
+
+    def setOccupancyLevel(self, occupancyval):
+        """
+        Set the square occupancy level.
+        :param occupancyval: The new occupancy level.
+        """
+        self.costMap.set_occupancy(self.Xpos, self.Ypos, occupancyval)
+
+    def __str__(self):
+        return str(self.getXpos()) + ' ' + str(self.getYpos()) + ' ' + str(self.isEmpty()) + ' ' + str(self.isUnknown())
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __eq__(self, other):
+        return other is not None and self.Xpos == other.Xpos and self.Ypos == other.Ypos
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.Xpos, self.Ypos))
@@ -0,0 +1,163 @@
+import heapq
+import threading
+
+from CostMap import octile_distance
+
+INFINITY = float('inf')
+
+
+class DStarLite(object):
+    """
+    An incremental planner that keeps its search tree between calls. The
+    search runs backwards from the goal, so when the robot moves or a few
+    cells change only the affected part of the tree is repaired instead of
+    planning again from scratch.
+    """
+
+    def __init__(self, costMap, goal_x, goal_y):
+        """
+        Create a planner for one goal on one map.
+        :param costMap: The CostMap to plan on.
+        :param goal_x: The goal X position on the grid.
+        :param goal_y: The goal Y position on the grid.
+        """
+        self.costMap = costMap
+        self.goal_x = goal_x
+        self.goal_y = goal_y
+        self.goal = costMap.index(goal_x, goal_y)
+        self.start = None
+        self.last_start = None
+        self.km = 0
+        self.g = {}
+        self.rhs = {self.goal: 0}
+        # Heap of (key, cell index), and the current key of every queued cell
+        self.open_heap = []
+        self.open_key = {}
+        self.expansions = 0
+        # Cells reported by map updates that have not been repaired yet
+        self.changed_cells = set()
+        self.changed_lock = threading.Lock()
+
+    def mark_changed(self, cells):
+        """
+        Record cells whose occupancy changed. They are repaired on the next
+        call to plan, so this is safe to call from a map callback.
+        :param cells: An iterable of flat cell indices.
+        """
+        with self.changed_lock:
+            self.changed_cells.update(cells)
+
+    def plan(self, x_cell, y_cell):
+        """
+        Plan from a start cell to the goal, reusing the previous search.
+        :param x_cell: The starting X cell on the map.
+        :param y_cell: The starting Y cell on the map.
+        :return: A list of cell indices from the cell after the start to the
+        goal, or None if the goal cannot be reached.
+        """
+        start = self.costMap.index(x_cell, y_cell)
+        if self.start is None:
+            self.last_start = start
+            self._push(self.goal, self._calculate_key(self.goal, start))
+        elif start != self.last_start:
+            # Moving the start lowers every queued key by at most the distance moved
+            self.km += self._heuristic(self.last_start, start)
+            self.last_start = start
+        self.start = start
+
+        with self.changed_lock:
+            changed, self.changed_cells = self.changed_cells, set()
+        for cell in changed:
+            # Only the cost of moving into a changed cell is affected
+            for s, cost in self.costMap.neighbors(cell):
+                self._update_vertex(s)
+
+        self._compute_shortest_path()
+
+        if self._g(start) == INFINITY:
+            return None
+        path = []
+        current = start
+        while current != self.goal:
+            best, best_cost = None, INFINITY
+            for s, cost in self._successors(current):
+                if cost + self._g(s) < best_cost:
+                    best, best_cost = s, cost + self._g(s)
+            if best is None:
+                return None
+            path.append(best)
+            current = best
+        return path
+
+    def _heuristic(self, a, b):
+        width = self.costMap.width
+        return octile_distance(a % width, a // width, b % width, b // width)
+
+    def _g(self, s):
+        return self.g.get(s, INFINITY)
+
+    def _rhs(self, s):
+        return self.rhs.get(s, INFINITY)
+
+    def _successors(self, u):
+        """
+        The cells reachable in one move from u. Moving into an occupied cell is
+        not allowed, the same as in astar.
+        """
+        empty = self.costMap.empty.ravel()
+        return [(s, cost) for s, cost in self.costMap.neighbors(u) if empty[s]]
+
+    def _calculate_key(self, s, start=None):
+        if start is None:
+            start = self.start
+        m = min(self._g(s), self._rhs(s))
+        return (m + self._heuristic(start, s) + self.km, m)
+
+    def _push(self, s, key):
+        self.open_key[s] = key
+        heapq.heappush(self.open_heap, (key, s))
+
+    def _top_key(self):
+        """
+        Drop stale heap entries and return the smallest valid key.
+        """
+        while self.open_heap:
+            key, s = self.open_heap[0]
+            if self.open_key.get(s) == key:
+                return key
+            heapq.heappop(self.open_heap)
+        return (INFINITY, INFINITY)
+
+    def _update_vertex(self, u):
+        if u != self.goal:
+            rhs = INFINITY
+            for s, cost in self._successors(u):
+                rhs = min(rhs, cost + self._g(s))
+            self.rhs[u] = rhs
+        if self._g(u) != self._rhs(u):
+            self._push(u, self._calculate_key(u))
+        else:
+            self.open_key.pop(u, None)
+
+    def _compute_shortest_path(self):
+        while True:
+            top_key = self._top_key()
+            if top_key == (INFINITY, INFINITY):
+                break
+            if not (top_key < self._calculate_key(self.start) or self._rhs(self.start) != self._g(self.start)):
+                break
+            k_old, u = heapq.heappop(self.open_heap)
+            self.expansions += 1
+            k_new = self._calculate_key(u)
+            if k_old < k_new:
+                self._push(u, k_new)
+                continue
+            del self.open_key[u]
+            if self._g(u) > self._rhs(u):
+                self.g[u] = self._rhs(u)
+            else:
+                self.g[u] = INFINITY
+                self._update_vertex(u)
+            # Every neighbor can move into u, so all of them may need a new rhs
+            for s, cost in self.costMap.neighbors(u):
+                self._update_vertex(s)
@@ -0,0 +1,67 @@
+import numpy
+
+
+class FreeCellIndex(object):
+    """
+    The closest known empty cell to every cell of a map, found once so that
+    each lookup after is a single array index. Closest is in 8-connected
+    steps, the same as searching outwards from the cell a ring at a time.
+    The index is a snapshot, so it has to be built again when the map changes.
+    """
+
+    def __init__(self, costMap):
+        """
+        :param costMap: The CostMap to index.
+        """
+        self.costMap = costMap
+        self.nearest = nearest_cells(costMap.empty & ~costMap.unknown)
+
+    def closest(self, x, y):
+        """
+        :param x: The X grid position.
+        :param y: The Y grid position.
+        :return: The closest known empty cell to the position, itself if it is
+        one, or None if the map has no known empty cells.
+        """
+        nearest = self.nearest[y * self.costMap.width + x]
+        if nearest < 0:
+            return None
+        return self.costMap.cell(nearest % self.costMap.width, nearest // self.costMap.width)
+
+
+def nearest_cells(mask):
+    """
+    Find the closest True cell to every cell, measured in 8-connected steps,
+    with a two pass raster scan: down the map taking the cells above and to
+    the left into account, then back up taking those below and to the right.
+    Each row is done at once, with the pass along it as a running minimum.
+    :param mask: A (height, width) boolean array.
+    :return: A flat array of the flat index of the closest True cell to each
+    cell, the one with the lowest index where several are as close, or -1 if
+    there are no True cells.
+    """
+    height, width = mask.shape
+    size = width * height
+    # Each cell holds its distance and closest cell in one key, distance * size + index, so that the smallest key
+    # is the closest cell. No distance on the map reaches width + height.
+    unreached = (width + height) * size
+    keys = numpy.where(mask.ravel(), numpy.arange(size, dtype=numpy.int64), unreached).reshape(height, width)
+    step = numpy.arange(width, dtype=numpy.int64) * size
+
+    for rows, backwards in ((range(height), False), (range(height - 1, -1, -1), True)):
+        previous = None
+        for y in rows:
+            row = keys[y, ::-1] if backwards else keys[y]
+            if previous is not None:
+                # One step from the row before, straight or diagonally
+                above = previous + size
+                numpy.minimum(row, above, out=row)
+                numpy.minimum(row[1:], above[:-1], out=row[1:])
+                numpy.minimum(row[:-1], above[1:], out=row[:-1])
+            # One step per cell along the row
+            row[:] = numpy.minimum.accumulate(row - step) + step
+            previous = row
+
+    nearest = keys.ravel() % size
+    nearest[keys.ravel() >= unreached] = -1
+    return nearest
@@ -1,43 +1,31 @@
-class Frontier:
-    size = 0
-    centroid = 0
-    gridCells = []
+from Region import Region
 
-    def __init__(self, cell_list, cell_matrix):
-        self.gridCells = cell_list
-        self.size = len(cell_list)
-        self.centroid = self.get_centroid(cell_matrix)
 
-    def get_centroid(self, cell_matrix):
-        xsum = 0
-        ysum = 0
-        for cell in self.gridCells:
-            xsum += cell.getXpos()
-            ysum += cell.getYpos()
-        newx = xsum // self.size
-        newy = ysum // self.size
-        explored = []
-        unexplored = [cell_matrix[newx][newy]]
-        while True:
-            for cell in unexplored:
-                if cell not in explored:
-                    explored.append(cell)
-                    if cell.isEmpty() and not cell.isUnknown():
-                        return cell
-                    else:
-                        try:
-                            unexplored.append(cell_matrix[newx + 1][newy])
-                        except ValueError:
-                            pass
-                        try:
-                            unexplored.append(cell_matrix[newx - 1][newy])
-                        except ValueError:
-                            pass
-                        try:
-                            unexplored.append(cell_matrix[newx][newy + 1])
-                        except ValueError:
-                            pass
-                        try:
-                            unexplored.append(cell_matrix[newx][newy - 1])
-                        except ValueError:
-                            pass
+class Frontier(object):
+    """
+    A group of 8-connected frontier cells, with its size, bounding box and
+    centroid worked out once when it is found.
+    """
+
+    def __init__(self, costMap, xs, ys):
+        """
+        :param costMap: The CostMap the cells are on.
+        :param xs: An array of the X grid positions of the cells.
+        :param ys: An array of the Y grid positions of the cells, in the same order.
+        """
+        self.xs = xs
+        self.ys = ys
+        self.size = len(xs)
+        # The smallest Region holding every cell
+        self.bbox = Region(int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+        # The mean X and Y of the cells, which needn't be on a frontier cell
+        self.centroid = (float(xs.mean()), float(ys.mean()))
+        self.gridCells = costMap.cells((ys * costMap.width + xs).tolist())
+
+    def get_centroid(self, free_cells):
+        """
+        :param free_cells: A FreeCellIndex of the map the frontier is on.
+        :return: The known empty cell closest to the centroid, or None if the
+        map has no known empty cells.
+        """
+        return free_cells.closest(int(self.centroid[0]), int(self.centroid[1]))
@@ -0,0 +1,390 @@
+import math
+
+import numpy
+
+from CostMap import CostMap
+from FreeCellIndex import FreeCellIndex
+from Frontier import Frontier
+from Region import Region
+
+# How far obstacles are inflated by default, in cells
+INFLATION_RADIUS = 5
+# The level of the known empty cells closest to the inflation when the cost falls off, the highest that is still empty
+FALLOFF_LEVEL = 30
+
+
+def expand_objects(costMap, region=None, radius=INFLATION_RADIUS, falloff=0):
+    """
+    Inflate the obstacles in a map in place, so that every cell within radius
+    cells of an obstacle is marked occupied too.
+    :param costMap: The CostMap to inflate.
+    :param region: If given, only the cells in this Region are inflated, from
+    the obstacles near enough to reach them. They must hold the map's own
+    occupancy, not an earlier inflation.
+    :param radius: How far obstacles are inflated, in cells, e.g. the robot's radius.
+    :param falloff: If given, known empty cells up to this many cells past
+    the inflation get a cost that falls off from FALLOFF_LEVEL to nothing
+    with their distance from the nearest obstacle. They stay empty.
+    """
+    if region is None:
+        region = Region(0, 0, costMap.width, costMap.height)
+    reach = radius + falloff
+    # Only the obstacles within reach of the region can affect it
+    source = region.grow(reach, costMap.width, costMap.height)
+    distances = squared_obstacle_distances(costMap.occupancy[source.slices] > 90, reach)
+    distances = distances[region.y0 - source.y0:region.y1 - source.y0, region.x0 - source.x0:region.x1 - source.x0]
+
+    # The obstacles themselves keep their level
+    occupancy = costMap.occupancy[region.slices]
+    inflated = (distances <= radius * radius) & (occupancy <= 90)
+    occupancy[inflated] = 60
+    costMap.empty[region.slices][inflated] = False
+    costMap.unknown[region.slices][inflated] = False
+
+    if falloff:
+        graded = (distances <= reach * reach) & ~inflated & (occupancy >= 0) & (occupancy <= FALLOFF_LEVEL)
+        costs = numpy.ceil(FALLOFF_LEVEL * (reach - numpy.sqrt(distances[graded])) / float(falloff))
+        occupancy[graded] = numpy.maximum(occupancy[graded], costs.astype(numpy.int8))
+
+
+def squared_obstacle_distances(obstacles, limit):
+    """
+    Find the squared Euclidean distance from every cell to the nearest
+    obstacle, out to limit. The distance along each row is found first with
+    running maximums and minimums of the obstacle columns, which is linear in
+    the number of cells. The rows within limit above and below each cell are
+    then combined one offset at a time, so the whole transform takes time
+    proportional to the number of cells times limit. A fully linear transform
+    such as Meijster's has to scan the rows one by one, which in numpy is
+    slower than this for any limit a robot radius needs.
+    :param obstacles: A (height, width) boolean array of the obstacle cells.
+    :param limit: The farthest distance needed, in cells.
+    :return: A (height, width) array of squared distances in cells. They are
+    exact up to limit, and cells farther than that from every obstacle have
+    a distance over limit squared.
+    """
+    height, width = obstacles.shape
+    far = limit + 1
+    columns = numpy.arange(width)
+    # The columns of the nearest obstacle to the left and the right of each cell in its row
+    left = numpy.maximum.accumulate(numpy.where(obstacles, columns, -width - far), axis=1)
+    right = numpy.minimum.accumulate(numpy.where(obstacles, columns, 2 * width + far)[:, ::-1], axis=1)[:, ::-1]
+    # Small limits fit in 16 bits, which halves the memory the column pass goes through
+    dtype = numpy.int16 if 2 * far * far <= numpy.iinfo(numpy.int16).max else numpy.int32
+    row_distances = numpy.minimum(numpy.minimum(columns - left, right - columns), far).astype(dtype)
+    row_distances *= row_distances
+
+    # An obstacle within limit of a cell is in a row at most limit away
+    padded = numpy.full((height + 2 * limit, width), far * far, dtype=dtype)
+    padded[limit:limit + height] = row_distances
+    distances = row_distances
+    shifted = numpy.empty_like(distances)
+    for dy in range(1, limit + 1):
+        for top in (limit - dy, limit + dy):
+            numpy.add(padded[top:top + height], dy * dy, out=shifted)
+            numpy.minimum(distances, shifted, out=distances)
+    return distances
+
+
+class FrontierMap(object):
+    """
+    An inflated CostMap and its frontier cells, kept up to date across
+    successive snapshots of the same map. Only the part of the map near the
+    cells that changed since the last snapshot is inflated and searched for
+    frontier cells again.
+    """
+
+    def __init__(self, radius=INFLATION_RADIUS, falloff=0):
+        """
+        :param radius: How far obstacles are inflated, in cells.
+        :param falloff: How far past that the cost falls off, in cells, see expand_objects.
+        """
+        self.radius = radius
+        self.falloff = falloff
+        self.geometry = None
+        # The last snapshot as it was received, before inflation
+        self.raw = None
+        self.costMap = None
+        # A (height, width) array of which cells are frontier cells
+        self.frontier = None
+        # The FreeCellIndex of the inflated map, built when first needed after it changes
+        self.free = None
+
+    def update(self, geometry, width, height, data):
+        """
+        Take in a new snapshot of the map.
+        :param geometry: The MapGeometry of the snapshot.
+        :param width: The width of the map in cells.
+        :param height: The height of the map in cells.
+        :param data: The row-major occupancy data, e.g. OccupancyGrid.data.
+        :return: The Region of the inflated map that may have changed, or None
+        if the snapshot is the same as the last one.
+        """
+        raw = numpy.array(data, dtype=numpy.int8).reshape(height, width)
+        if self.raw is None or geometry != self.geometry or raw.shape != self.raw.shape:
+            self.geometry = geometry
+            self.raw = raw
+            self.free = None
+            self.costMap = CostMap(width, height, raw)
+            expand_objects(self.costMap, radius=self.radius, falloff=self.falloff)
+            self.frontier = numpy.zeros((height, width), dtype=bool)
+            self.find_frontier_cells(Region(0, 0, width, height))
+            return Region(0, 0, width, height)
+
+        changed = Region.from_mask(raw != self.raw)
+        if changed is None:
+            return None
+        self.raw = raw
+        self.free = None
+        # A change reaches as far as the inflation does. Put those cells back to the snapshot and inflate them again.
+        affected = changed.grow(self.radius + self.falloff, width, height)
+        self.costMap.occupancy[affected.slices] = raw[affected.slices]
+        self.costMap.empty[affected.slices] = raw[affected.slices] <= 30
+        self.costMap.unknown[affected.slices] = raw[affected.slices] < 0
+        expand_objects(self.costMap, affected, self.radius, self.falloff)
+        # Whether a cell is a frontier cell depends on its neighbors too
+        self.find_frontier_cells(affected.grow(1, width, height))
+        return affected
+
+    def find_frontier_cells(self, region):
+        """
+        Search a region of the map for frontier cells again.
+        :param region: The Region to search.
+        """
+        self.frontier[region.slices] = frontier_mask(self.costMap, region)
+
+    def free_cells(self):
+        """
+        :return: The FreeCellIndex of the inflated map as it is now.
+        """
+        if self.free is None:
+            self.free = FreeCellIndex(self.costMap)
+        return self.free
+
+    def frontier_indices(self):
+        """
+        :return: An array of the flat indices of every frontier cell, column by column.
+        """
+        xs, ys = numpy.nonzero(self.frontier.T)
+        return ys * self.costMap.width + xs
+
+    def find_frontiers(self, min_length=10):
+        """
+        Group the current frontier cells into continuous frontiers.
+        :param min_length: The shortest frontier to keep, in cells end to end.
+        :return: A list of the Frontiers at least min_length long, in the
+        order of their first cells column by column.
+        """
+        groups = label_frontiers(self.costMap, self.frontier_indices())
+        return [group for group in groups if is_long_enough(group, min_length)]
+
+
+def find_frontiers(costMap, min_length=10):
+    """
+    Detect frontiers in a map.
+    :param costMap: The CostMap to search.
+    :param min_length: The shortest frontier to keep, in cells end to end.
+    :return: A list of Frontiers
+    """
+    # Group the frontier cells into continuous frontiers and return them as a list
+    groups = label_frontiers(costMap, frontier_indices(costMap))
+
+    return [group for group in groups if is_long_enough(group, min_length)]
+
+
+def find_frontier_cells(costMap, region=None):
+    """
+    Collect every frontier cell in a map.
+    :param costMap: The CostMap to search.
+    :param region: If given, only the cells in this Region are searched.
+    :return: A list of the unknown cells next to known empty cells, column by column.
+    """
+    return costMap.cells(frontier_indices(costMap, region))
+
+
+def frontier_indices(costMap, region=None):
+    """
+    :param costMap: The CostMap to search.
+    :param region: If given, only the cells in this Region are searched.
+    :return: An array of the flat indices of the frontier cells, column by
+    column, the same order as find_frontier_cells.
+    """
+    if region is None:
+        region = Region(0, 0, costMap.width, costMap.height)
+    xs, ys = numpy.nonzero(frontier_mask(costMap, region).T)
+    return (ys + region.y0) * costMap.width + xs + region.x0
+
+
+def frontier_mask(costMap, region=None):
+    """
+    Find the frontier cells of a map, the unknown cells with a known empty
+    cell among their 8 neighbors, all at once.
+    :param costMap: The CostMap to search.
+    :param region: If given, only the cells in this Region are searched.
+    :return: A boolean array the shape of the region, True at the frontier cells.
+    """
+    if region is None:
+        region = Region(0, 0, costMap.width, costMap.height)
+    around = region.grow(1, costMap.width, costMap.height)
+    # The known empty cells around the region, padded so cells on the edge of the map have no neighbors past it
+    free = numpy.zeros((around.height + 2, around.width + 2), dtype=bool)
+    free[1:-1, 1:-1] = costMap.empty[around.slices] & ~costMap.unknown[around.slices]
+    # Grow the known empty cells by one cell in every direction, first along the rows, then the columns
+    top, left = region.y0 - around.y0, region.x0 - around.x0
+    rows = free[top:top + region.height + 2]
+    across = rows[:, left:left + region.width] | rows[:, left + 1:left + 1 + region.width] | \
+        rows[:, left + 2:left + 2 + region.width]
+    near_free = across[:-2] | across[1:-1] | across[2:]
+    # A known empty cell is never unknown, so counting the cell itself among its neighbors doesn't matter
+    return costMap.unknown[region.slices] & near_free
+
+
+def group_frontiers(ungrouped_frontier):
+    """
+    Group frontier cells into continuous frontiers.
+    :param ungrouped_frontier: A list of frontier cells.
+    :return: A list of frontiers, where each frontier is a list of connected
+    frontier cells. The frontiers and their cells are in the order of their
+    first cells in the list.
+    """
+    xs = numpy.array([cell.getXpos() for cell in ungrouped_frontier], dtype=numpy.intp)
+    ys = numpy.array([cell.getYpos() for cell in ungrouped_frontier], dtype=numpy.intp)
+    return [[ungrouped_frontier[i] for i in group.tolist()] for group in connected_components(xs, ys)]
+
+
+def label_frontiers(costMap, indices):
+    """
+    Group frontier cells into continuous Frontiers.
+    :param costMap: The CostMap the cells are on.
+    :param indices: An array of the flat indices of the frontier cells, e.g. from frontier_indices.
+    :return: A list of Frontiers, in the order of their first cells in indices.
+    """
+    indices = numpy.asarray(indices, dtype=numpy.intp)
+    xs, ys = indices % costMap.width, indices // costMap.width
+    return [Frontier(costMap, xs[group], ys[group]) for group in connected_components(xs, ys)]
+
+
+def connected_components(xs, ys):
+    """
+    Find the 8-connected groups of a set of cells with a union-find over the
+    pairs of neighboring cells, in time linear in the number of cells.
+    :param xs: An array of the X grid positions of the cells.
+    :param ys: An array of the Y grid positions of the cells. No cell may appear twice.
+    :return: A list of arrays of positions into xs and ys, one for each
+    group, in the order of each group's first cell. Each array is in order too.
+    """
+    count = len(xs)
+    if count == 0:
+        return []
+    # Number the cells on a grid just big enough for them, with a spare column on each side so no neighbor wraps
+    columns = int(xs.max() - xs.min()) + 3
+    flat = (ys - ys.min()) * columns + (xs - xs.min() + 1)
+    order = numpy.argsort(flat)
+    sorted_flat = flat[order]
+
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Join each cell to its neighbors to the east, south west, south and south east, which covers every pair once
+    for offset in (1, columns - 1, columns, columns + 1):
+        neighbors = flat + offset
+        found = numpy.minimum(numpy.searchsorted(sorted_flat, neighbors), count - 1)
+        joined = sorted_flat[found] == neighbors
+        for i, j in zip(numpy.flatnonzero(joined).tolist(), order[found[joined]].tolist()):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                # The earlier cell becomes the root, so each group is named by its first cell
+                if root_i < root_j:
+                    parent[root_j] = root_i
+                else:
+                    parent[root_i] = root_j
+
+    roots = numpy.array([find(i) for i in range(count)], dtype=numpy.intp)
+    # A stable sort keeps the cells of each group in order, and each root is its group's first cell
+    members = numpy.argsort(roots, kind='mergesort')
+    starts = numpy.flatnonzero(numpy.concatenate(([True], roots[members][1:] != roots[members][:-1])))
+    return numpy.split(members, starts[1:])
+
+
+def is_long_enough(frontier, min_length):
+    """
+    Check whether the longest distance between two cells of a Frontier is
+    at least min_length. Its bounding box settles most frontiers without
+    finding the distance: the distance is at least the longer side of the
+    box and at most its diagonal.
+    :param frontier: A Frontier.
+    :param min_length: The shortest length to accept, in cells.
+    :return: True if the frontier is at least min_length long.
+    """
+    span_x, span_y = frontier.bbox.width - 1, frontier.bbox.height - 1
+    if max(span_x, span_y) >= min_length:
+        return True
+    if span_x * span_x + span_y * span_y < min_length * min_length:
+        return False
+    return diameter(frontier.xs, frontier.ys) >= min_length
+
+
+def diameter(xs, ys):
+    """
+    Find the longest distance between two cells from the convex hull of the
+    cells with rotating calipers, in O(n log n) instead of comparing every pair.
+    :param xs: An array of the X grid positions of the cells.
+    :param ys: An array of the Y grid positions of the cells.
+    :return: The longest distance between two of the cells, 0 if there are fewer than two.
+    """
+    hull = convex_hull(xs, ys)
+    if len(hull) < 3:
+        return math.hypot(hull[-1][0] - hull[0][0], hull[-1][1] - hull[0][1]) if hull else 0
+
+    def area(a, b, c):
+        return abs((b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0]))
+
+    # For each edge of the hull, advance to the point farthest from it. The farthest pair is among these.
+    count = len(hull)
+    longest = 0
+    j = 1
+    for i in range(count):
+        a, b = hull[i], hull[(i + 1) % count]
+        while area(a, b, hull[(j + 1) % count]) > area(a, b, hull[j]):
+            j = (j + 1) % count
+        for p in (a, b):
+            longest = max(longest, (p[0] - hull[j][0]) ** 2 + (p[1] - hull[j][1]) ** 2)
+    return math.sqrt(longest)
+
+
+def convex_hull(xs, ys):
+    """
+    Find the convex hull of a set of cells with Andrew's monotone chain.
+    :param xs: An array of the X grid positions of the cells.
+    :param ys: An array of the Y grid positions of the cells.
+    :return: A list of (x, y) tuples of the corners of the hull, counterclockwise
+    without repeating the first. One or two cells if all the cells are in a line.
+    """
+    if len(xs) == 0:
+        return []
+    # Only the lowest and highest cell of each column can be on the hull
+    order = numpy.lexsort((ys, xs))
+    xs, ys = xs[order], ys[order]
+    ends = numpy.concatenate(([True], xs[1:] != xs[:-1])) | numpy.concatenate((xs[1:] != xs[:-1], [True]))
+    points = list(zip(xs[ends].tolist(), ys[ends].tolist()))
+    if len(points) < 3:
+        return points[:1] if points[0] == points[-1] else [points[0], points[-1]]
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower, upper = [], []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    return lower[:-1] + upper[:-1]
@@ -0,0 +1,124 @@
+import threading
+
+
+class GoalFollower(object):
+    """
+    Drives the robot to a goal, deciding when to plan again and sending each
+    new plan. Replans are asked for with request: 'goal' for a new goal,
+    'arrived' when the robot stopped at the end of the plan it was sent, or
+    'map' when a map change affects the plan. Each replan sends its plan,
+    which replaces the one being driven.
+
+    Planning and sending are done by the callables it is given, so it doesn't
+    depend on ROS or on a planner.
+    """
+
+    def __init__(self, plan, send, near=5):
+        """
+        :param plan: A callable taking (start_x, start_y, goal_x, goal_y,
+        on_solution) that plans from the robot's cell to the goal cell. It
+        returns the plan's waypoints, an empty list if the robot is at the
+        goal, or None if there is no path. on_solution may be called with the
+        waypoints of each path an anytime planner finds before it returns.
+        :param send: A callable taking a list of waypoints, which sends the
+        robot along them.
+        :param near: How close to the goal on both axes, in cells, the robot
+        has to plan from for the end of the plan sent to finish the goal.
+        """
+        self.plan = plan
+        self.send = send
+        self.near = near
+        # The goal cell, whether there is a goal to drive to, and whether the last plan sent finishes it
+        self.goal = None
+        self.active = False
+        self.final_leg = False
+        # Whether the robot is driving a plan
+        self.moving = False
+        # Wakes wait, with the reasons for replanning in events
+        self.condition = threading.Condition()
+        self.events = set()
+
+    def set_goal(self, goal_x, goal_y):
+        """
+        Start driving to a new goal.
+        :param goal_x: The goal X cell on the map.
+        :param goal_y: The goal Y cell on the map.
+        """
+        self.goal = (goal_x, goal_y)
+        self.final_leg = False
+        self.active = True
+        self.request('goal')
+
+    def set_moving(self, moving):
+        """
+        Record whether the robot is driving. It has arrived at the end of its
+        plan, or given up on it, when it stops.
+        :param moving: Whether the robot is driving a plan.
+        """
+        was_moving = self.moving
+        self.moving = moving
+        if was_moving and not moving:
+            self.request('arrived')
+
+    def request(self, reason):
+        """
+        Ask for a replan.
+        :param reason: 'goal', 'arrived' or 'map'.
+        """
+        with self.condition:
+            self.events.add(reason)
+            self.condition.notify()
+
+    def wait(self, timeout=None):
+        """
+        Wait for replans to be asked for.
+        :param timeout: The most seconds to wait.
+        :return: The set of reasons asked for since the last call, empty if none were before the timeout.
+        """
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            events = self.events
+            self.events = set()
+        return events
+
+    def handle(self, events, start_x, start_y):
+        """
+        Replan for the reasons given and send the plan.
+        :param events: A set of reasons from wait.
+        :param start_x: The robot's X cell on the map.
+        :param start_y: The robot's Y cell on the map.
+        :return: None if there was nothing to do, 'reached' if the goal has
+        been reached, 'no path' if there is no path to it, or 'sent' if a
+        plan was sent.
+        """
+        if not self.active or not events:
+            return None
+        if 'arrived' in events and 'goal' not in events and self.final_leg:
+            self.active = False
+            return 'reached'
+
+        goal_x, goal_y = self.goal
+        close = abs(goal_x - start_x) < self.near and abs(goal_y - start_y) < self.near
+        # Whether a plan has been sent for this replan
+        sent = [False]
+
+        def send_early(path):
+            # The anytime planner's paths go out as they are found, each better one replacing the last
+            if not path:
+                return
+            self.final_leg = close
+            self.send(path)
+            sent[0] = True
+
+        path = self.plan(start_x, start_y, goal_x, goal_y, send_early)
+        if path is None:
+            return 'no path'
+        if not path:
+            self.active = False
+            return 'reached'
+        # The anytime planner has already sent its best path
+        if not sent[0]:
+            self.final_leg = close
+            self.send(path)
+        return 'sent'
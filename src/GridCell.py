@@ -1,3 +1,6 @@
+from CostMap import octile_distance
+
+
 class GridCell:
     Gval = 0
 
@@ -13,11 +16,12 @@ class GridCell:
 
     def setH(self, goalX, goalY):
         """
-        sets the H value to the manhattan distance to the goal
+        sets the H value to the octile distance to the goal, which matches the
+        10 and 14 move costs in setParent
         :param goalX: The goal X position on the grid.
         :param goalY: The goal Y position on the grid.
         """
-        self.Hval = (abs(goalX - self.Xpos) + abs(goalY - self.Ypos)) * 10 + self.getOccupancyLevel()
+        self.Hval = octile_distance(self.Xpos, self.Ypos, goalX, goalY)
 
     def setParent(self, parentCell):
         """
@@ -0,0 +1,294 @@
+import heapq
+import threading
+
+from CostMap import NEIGHBOR_OFFSETS, octile_distance
+
+INFINITY = float('inf')
+
+
+class HierarchicalPlanner(object):
+    """
+    Hierarchical path planning (HPA*). The map is split into square clusters
+    and the empty cells where two clusters meet become entrances. A query runs
+    A* over the small graph of entrances and then refines each abstract edge
+    into the grid path cached for it.
+
+    Entrances are found when the planner is built, on the borders between
+    side by side clusters and at the corners between diagonal ones. The distances from an
+    entrance to the others in its cluster come from one search inside the
+    cluster, which runs the first time the entrance is used and is then cached.
+    When cells change, only the touched clusters and their neighbors are rebuilt.
+    """
+
+    def __init__(self, costMap, cluster_size=16):
+        """
+        Split the map into clusters and find the entrances between them.
+        :param costMap: The CostMap to plan on.
+        :param cluster_size: The width and height of a cluster in cells.
+        """
+        self.costMap = costMap
+        self.cluster_size = cluster_size
+        self.clusters_x = (costMap.width + cluster_size - 1) // cluster_size
+        self.clusters_y = (costMap.height + cluster_size - 1) // cluster_size
+        # Entrance pairs on each border, keyed by the (left or lower cluster, other cluster) pair, lowest first
+        self.borders = {}
+        # The entrance cells of each cluster
+        self.nodes = {}
+        # The cells each entrance cell connects to across a border
+        self.inter = {}
+        # Cached search from each entrance cell: (distances, parents)
+        self.intra = {}
+        self.expansions = 0
+        # Cells reported by map updates that have not been applied yet
+        self.changed_cells = set()
+        self.changed_lock = threading.Lock()
+
+        for cy in range(self.clusters_y):
+            for cx in range(self.clusters_x):
+                self.nodes[(cx, cy)] = set()
+        for cy in range(self.clusters_y):
+            for cx in range(self.clusters_x):
+                if cx + 1 < self.clusters_x:
+                    self._build_border((cx, cy), (cx + 1, cy))
+                if cy + 1 < self.clusters_y:
+                    self._build_border((cx, cy), (cx, cy + 1))
+                # Clusters that only meet at a corner can be crossed by one diagonal move
+                if cx + 1 < self.clusters_x and cy + 1 < self.clusters_y:
+                    self._build_border((cx, cy), (cx + 1, cy + 1))
+                if cx + 1 < self.clusters_x and cy > 0:
+                    self._build_border((cx, cy), (cx + 1, cy - 1))
+
+    def mark_changed(self, cells, costMap=None):
+        """
+        Record cells whose occupancy changed. Their clusters are rebuilt on the
+        next call to plan, so this is safe to call from a map callback.
+        :param cells: An iterable of flat cell indices.
+        :param costMap: If given, a new CostMap of the same size to plan on
+        instead, which differs from the current one only in these cells.
+        """
+        with self.changed_lock:
+            self.changed_cells.update(cells)
+            if costMap is not None:
+                self.costMap = costMap
+
+    def plan(self, start_x, start_y, goal_x, goal_y):
+        """
+        Plan a path by searching the abstract graph and refining it.
+        :param start_x: The starting X cell on the map.
+        :param start_y: The starting Y cell on the map.
+        :param goal_x: The goal X cell on the map.
+        :param goal_y: The goal Y cell on the map.
+        :return: A tuple of the path, a list of cell indices from the cell after
+        the start to the goal or None if there is no path, and the number of
+        abstract nodes expanded.
+        """
+        self._apply_changes()
+        width = self.costMap.width
+        start = start_y * width + start_x
+        goal = goal_y * width + goal_x
+        start_cluster = self._cluster_of(start)
+        goal_cluster = self._cluster_of(goal)
+
+        # Connect the start to the entrances of its cluster
+        start_dist, start_parents = self._search_cluster(start, start_cluster)
+
+        g_score = {start: 0}
+        parents = {start: None}
+        closed = set()
+        open_heap = [(octile_distance(start_x, start_y, goal_x, goal_y), 0, start)]
+        counter = 0
+        expansions = 0
+
+        while open_heap:
+            current = heapq.heappop(open_heap)[2]
+            if current in closed:
+                continue
+            closed.add(current)
+            expansions += 1
+            if current == goal:
+                break
+
+            if current == start:
+                distances = start_dist
+            else:
+                distances = self._intra_edges(current)[0]
+            cluster = self._cluster_of(current)
+            edges = [(n, distances[n]) for n in self.nodes[cluster] if n != current and n in distances]
+            x, y = current % width, current // width
+            edges.extend((n, 10 if n % width == x or n // width == y else 14) for n in self.inter.get(current, ()))
+            # The goal is reached from the entrances of its own cluster
+            if cluster == goal_cluster and goal in distances:
+                edges.append((goal, distances[goal]))
+
+            for n, cost in edges:
+                if n in closed:
+                    continue
+                tentative = g_score[current] + cost
+                if tentative < g_score.get(n, INFINITY):
+                    g_score[n] = tentative
+                    parents[n] = current
+                    counter += 1
+                    h = octile_distance(n % width, n // width, goal_x, goal_y)
+                    heapq.heappush(open_heap, (tentative + h, counter, n))
+
+        self.expansions += expansions
+        if goal not in closed:
+            return None, expansions
+
+        # Refine each abstract edge into grid cells
+        abstract = []
+        current = goal
+        while current is not None:
+            abstract.append(current)
+            current = parents[current]
+        abstract.reverse()
+
+        path = []
+        for a, b in zip(abstract, abstract[1:]):
+            if self._cluster_of(a) != self._cluster_of(b):
+                # An entrance pair is one move across the border
+                path.append(b)
+            elif a == start:
+                path.extend(self._walk(start_parents, b, start))
+            else:
+                path.extend(self._walk(self._intra_edges(a)[1], b, a))
+        return path, expansions
+
+    def _apply_changes(self):
+        with self.changed_lock:
+            changed, self.changed_cells = self.changed_cells, set()
+        if not changed:
+            return
+        dirty = set(self._cluster_of(cell) for cell in changed)
+        for cx, cy in dirty:
+            for dx, dy in NEIGHBOR_OFFSETS:
+                other = (cx + dx, cy + dy)
+                if other in self.nodes:
+                    self._build_border(min(other, (cx, cy)), max(other, (cx, cy)))
+        # A cached search covers its whole cluster, so only searches inside a
+        # dirty cluster are stale. Neighbors just gain or lose entrances.
+        for node in list(self.intra):
+            if self._cluster_of(node) in dirty:
+                del self.intra[node]
+
+    def _cluster_of(self, index):
+        width = self.costMap.width
+        return (index % width) // self.cluster_size, (index // width) // self.cluster_size
+
+    def _cluster_bounds(self, cluster):
+        x0 = cluster[0] * self.cluster_size
+        y0 = cluster[1] * self.cluster_size
+        return x0, y0, min(x0 + self.cluster_size, self.costMap.width), min(y0 + self.cluster_size, self.costMap.height)
+
+    def _build_border(self, a, b):
+        """
+        Find the entrances between clusters a and b, where b is to the right
+        of a, above it, or diagonally next to it on the right. Each run of open
+        cell pairs straight across the border gets one entrance in its middle,
+        or one at each end if it is 6 cells or longer. A diagonal move across
+        is an entrance of its own when both cells beside it are blocked, since
+        then no straight pair leads the same way.
+        """
+        for cell_a, cell_b in self.borders.get((a, b), ()):
+            self._remove_node(cell_a, cell_b, a)
+            self._remove_node(cell_b, cell_a, b)
+
+        width = self.costMap.width
+        empty = self.costMap.empty.ravel()
+        x0, y0, x1, y1 = self._cluster_bounds(a)
+        if b[1] == a[1]:
+            pairs = [(y * width + x1 - 1, y * width + x1) for y in range(y0, y1)]
+            diagonals = [((x1 - 1, y), (x1, y + dy)) for y in range(y0, y1) for dy in (-1, 1) if y0 <= y + dy < y1]
+        elif b[0] == a[0]:
+            pairs = [((y1 - 1) * width + x, y1 * width + x) for x in range(x0, x1)]
+            diagonals = [((x, y1 - 1), (x + dx, y1)) for x in range(x0, x1) for dx in (-1, 1) if x0 <= x + dx < x1]
+        elif b[1] > a[1]:
+            pairs = []
+            diagonals = [((x1 - 1, y1 - 1), (x1, y1))]
+        else:
+            pairs = []
+            diagonals = [((x1 - 1, y0), (x1, y0 - 1))]
+
+        entrances = []
+        run = []
+        for pair in pairs + [None]:
+            if pair is not None and empty[pair[0]] and empty[pair[1]]:
+                run.append(pair)
+                continue
+            if len(run) >= 6:
+                entrances.extend((run[0], run[-1]))
+            elif run:
+                entrances.append(run[len(run) // 2])
+            run = []
+        for (ax, ay), (bx, by) in diagonals:
+            if empty[ay * width + ax] and empty[by * width + bx] and \
+                    not empty[ay * width + bx] and not empty[by * width + ax]:
+                entrances.append((ay * width + ax, by * width + bx))
+
+        self.borders[(a, b)] = entrances
+        for cell_a, cell_b in entrances:
+            self.nodes[a].add(cell_a)
+            self.nodes[b].add(cell_b)
+            self.inter.setdefault(cell_a, set()).add(cell_b)
+            self.inter.setdefault(cell_b, set()).add(cell_a)
+
+    def _remove_node(self, cell, partner, cluster):
+        partners = self.inter.get(cell)
+        if partners is None:
+            return
+        partners.discard(partner)
+        if not partners:
+            del self.inter[cell]
+            self.nodes[cluster].discard(cell)
+
+    def _intra_edges(self, node):
+        if node not in self.intra:
+            self.intra[node] = self._search_cluster(node, self._cluster_of(node))
+        return self.intra[node]
+
+    def _search_cluster(self, source, cluster):
+        """
+        Dijkstra from a cell to every cell of its cluster, moving only into
+        empty cells.
+        :return: A tuple of (distances, parents) dicts keyed by cell index.
+        """
+        width = self.costMap.width
+        empty = self.costMap.empty.ravel()
+        x0, y0, x1, y1 = self._cluster_bounds(cluster)
+        distances = {source: 0}
+        parents = {source: None}
+        done = set()
+        open_heap = [(0, source)]
+        while open_heap:
+            dist, current = heapq.heappop(open_heap)
+            if current in done:
+                continue
+            done.add(current)
+            x, y = current % width, current // width
+            for nx in (x - 1, x, x + 1):
+                if nx < x0 or nx >= x1:
+                    continue
+                for ny in (y - 1, y, y + 1):
+                    if ny < y0 or ny >= y1:
+                        continue
+                    n = ny * width + nx
+                    if n in done or not empty[n]:
+                        continue
+                    tentative = dist + (10 if nx == x or ny == y else 14)
+                    if tentative < distances.get(n, INFINITY):
+                        distances[n] = tentative
+                        parents[n] = current
+                        heapq.heappush(open_heap, (tentative, n))
+        return distances, parents
+
+    def _walk(self, parents, cell, source):
+        """
+        Follow a search's parents from a cell back to its source.
+        :return: The cells from the one after the source up to the given cell.
+        """
+        segment = []
+        while cell != source:
+            segment.append(cell)
+            cell = parents[cell]
+        segment.reverse()
+        return segment
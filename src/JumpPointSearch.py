@@ -0,0 +1,137 @@
+import heapq
+
+from CostMap import NEIGHBOR_OFFSETS, octile_distance
+
+
+def jump_point_search(costMap, start_x, start_y, goal_x, goal_y):
+    """
+    Plan a path with Jump Point Search. It finds the same cost paths as A*
+    with 10/14 move costs, but skips over the symmetric runs of open cells in
+    large rooms and only expands the jump points between them.
+    :param costMap: The CostMap to plan on.
+    :param start_x: The starting X cell on the map.
+    :param start_y: The starting Y cell on the map.
+    :param goal_x: The goal X cell on the map.
+    :param goal_y: The goal Y cell on the map.
+    :return: A tuple of the path, a list of cell indices from the cell after
+    the start to the goal or None if there is no path, and the number of jump
+    points expanded.
+    """
+    width = costMap.width
+    height = costMap.height
+    empty = costMap.empty.ravel()
+
+    def walkable(x, y):
+        return 0 <= x < width and 0 <= y < height and empty[y * width + x]
+
+    def jump(x, y, dx, dy):
+        """
+        Step from (x, y) in direction (dx, dy) until a jump point is found.
+        :return: The jump point as an (x, y) tuple, or None.
+        """
+        while True:
+            x += dx
+            y += dy
+            if not walkable(x, y):
+                return None
+            if x == goal_x and y == goal_y:
+                return x, y
+            if dx != 0 and dy != 0:
+                if (walkable(x - dx, y + dy) and not walkable(x - dx, y)) or \
+                        (walkable(x + dx, y - dy) and not walkable(x, y - dy)):
+                    return x, y
+                # A diagonal cell is a jump point if a straight run from it finds one
+                if jump(x, y, dx, 0) is not None or jump(x, y, 0, dy) is not None:
+                    return x, y
+            elif dx != 0:
+                if (walkable(x + dx, y + 1) and not walkable(x, y + 1)) or \
+                        (walkable(x + dx, y - 1) and not walkable(x, y - 1)):
+                    return x, y
+            else:
+                if (walkable(x + 1, y + dy) and not walkable(x + 1, y)) or \
+                        (walkable(x - 1, y + dy) and not walkable(x - 1, y)):
+                    return x, y
+
+    def directions(x, y, parent):
+        """
+        The directions worth searching from (x, y) given how it was reached:
+        the natural neighbors plus any forced by an adjacent obstacle.
+        """
+        if parent is None:
+            return NEIGHBOR_OFFSETS
+        px, py = parent % width, parent // width
+        dx = (x > px) - (x < px)
+        dy = (y > py) - (y < py)
+        if dx != 0 and dy != 0:
+            dirs = [(dx, 0), (0, dy), (dx, dy)]
+            if not walkable(x - dx, y):
+                dirs.append((-dx, dy))
+            if not walkable(x, y - dy):
+                dirs.append((dx, -dy))
+        elif dx != 0:
+            dirs = [(dx, 0)]
+            if not walkable(x, y + 1):
+                dirs.append((dx, 1))
+            if not walkable(x, y - 1):
+                dirs.append((dx, -1))
+        else:
+            dirs = [(0, dy)]
+            if not walkable(x + 1, y):
+                dirs.append((1, dy))
+            if not walkable(x - 1, y):
+                dirs.append((-1, dy))
+        return dirs
+
+    start = start_y * width + start_x
+    goal = goal_y * width + goal_x
+    g_score = {start: 0}
+    parents = {start: None}
+    closed = set()
+    open_heap = [(octile_distance(start_x, start_y, goal_x, goal_y), 0, start)]
+    counter = 0
+    expansions = 0
+
+    while open_heap:
+        current = heapq.heappop(open_heap)[2]
+        if current in closed:
+            continue
+        closed.add(current)
+        expansions += 1
+        if current == goal:
+            break
+        x, y = current % width, current // width
+        for dx, dy in directions(x, y, parents[current]):
+            point = jump(x, y, dx, dy)
+            if point is None:
+                continue
+            jx, jy = point
+            n = jy * width + jx
+            if n in closed:
+                continue
+            # Every jump is a straight or diagonal run, so its cost is the octile distance
+            tentative = g_score[current] + octile_distance(x, y, jx, jy)
+            if tentative < g_score.get(n, tentative + 1):
+                g_score[n] = tentative
+                parents[n] = current
+                counter += 1
+                heapq.heappush(open_heap, (tentative + octile_distance(jx, jy, goal_x, goal_y), counter, n))
+
+    if goal not in closed:
+        return None, expansions
+
+    # Fill in the cells between consecutive jump points
+    path = []
+    current = goal
+    while parents[current] is not None:
+        parent = parents[current]
+        x, y = current % width, current // width
+        px, py = parent % width, parent // width
+        dx = (px > x) - (px < x)
+        dy = (py > y) - (py < y)
+        while (x, y) != (px, py):
+            path.append(y * width + x)
+            x += dx
+            y += dy
+        current = parent
+    path.reverse()
+    return path, expansions
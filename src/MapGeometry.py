@@ -0,0 +1,56 @@
+import math
+
+
+class MapGeometry(object):
+    """
+    Where a grid lies in the world: the world position of its corner and the
+    size of a cell. Converts between grid cells and world coordinates.
+    """
+
+    def __init__(self, origin_x, origin_y, resolution):
+        """
+        :param origin_x: The world X coordinate of the corner of cell (0, 0).
+        :param origin_y: The world Y coordinate of the corner of cell (0, 0).
+        :param resolution: The width and height of a cell in meters.
+        """
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.resolution = resolution
+
+    @classmethod
+    def from_map_info(cls, info):
+        """
+        :param info: A nav_msgs/MapMetaData, e.g. OccupancyGrid.info.
+        :return: The geometry of the map.
+        """
+        return cls(info.origin.position.x, info.origin.position.y, info.resolution)
+
+    def to_grid(self, world_x, world_y):
+        """
+        Map a world coordinate to a grid cell position.
+        :param world_x: The world X coordinate.
+        :param world_y: The world Y coordinate.
+        :return: A tuple representing the X, Y coordinate on the grid.
+        """
+        grid_x = int(math.floor((world_x - self.origin_x) / self.resolution))
+        grid_y = int(math.floor((world_y - self.origin_y) / self.resolution))
+        return grid_x, grid_y
+
+    def to_world(self, grid_x, grid_y):
+        """
+        Map a grid X and Y to the world coordinate of the cell's center.
+        Numpy arrays of positions are mapped all at once.
+        :param grid_x: The grid X position.
+        :param grid_y: The grid Y position.
+        :return: A tuple representing the X, Y coordinate in the world frame.
+        """
+        world_x = grid_x * self.resolution + self.origin_x + self.resolution / 2
+        world_y = grid_y * self.resolution + self.origin_y + self.resolution / 2
+        return world_x, world_y
+
+    def __eq__(self, other):
+        return isinstance(other, MapGeometry) and \
+            (self.origin_x, self.origin_y, self.resolution) == (other.origin_x, other.origin_y, other.resolution)
+
+    def __ne__(self, other):
+        return not self == other
@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+
+from CostMap import NEIGHBOR_OFFSETS
+
+
+class PlanCache(object):
+    """
+    A bounded least-recently-used cache of planned paths, keyed by planner,
+    start cell and goal cell and stamped with the map revision they are valid
+    for. A map change advances the revision, but only drops the entries whose
+    path runs over or next to a changed cell. The rest are still valid and
+    move up to the new revision.
+    """
+
+    def __init__(self, size=32):
+        """
+        :param size: The most plans to keep.
+        """
+        self.size = size
+        self.revision = 0
+        self.hits = 0
+        self.misses = 0
+        # (mode, start, goal) -> (revision, result, guard cells)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, mode, start, goal):
+        """
+        Look up a plan for the current map revision.
+        :param mode: The planner name.
+        :param start: The flat index of the start cell.
+        :param goal: The flat index of the goal cell.
+        :return: The cached result, or None on a miss.
+        """
+        key = (mode, start, goal)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != self.revision:
+                self.misses += 1
+                return None
+            # Move the entry to the most recently used end
+            del self.entries[key]
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def put(self, mode, start, goal, revision, result, path, width, height):
+        """
+        Store a plan. It is not stored if the map changed while it was planned.
+        :param mode: The planner name.
+        :param start: The flat index of the start cell.
+        :param goal: The flat index of the goal cell.
+        :param revision: The map revision the plan was started at.
+        :param result: The value to return on a hit.
+        :param path: The flat cell indices of the planned path, and of any
+        other cells the robot drives over when it follows it.
+        :param width: The width of the map in cells.
+        :param height: The height of the map in cells.
+        """
+        # A changed cell on or next to the path, or next to the start, invalidates the plan
+        guard = set()
+        for index in [start] + list(path):
+            x, y = index % width, index // width
+            guard.add(index)
+            for dx, dy in NEIGHBOR_OFFSETS:
+                if 0 <= x + dx < width and 0 <= y + dy < height:
+                    guard.add((y + dy) * width + x + dx)
+
+        key = (mode, start, goal)
+        with self.lock:
+            if revision != self.revision:
+                return
+            self.entries.pop(key, None)
+            self.entries[key] = (revision, result, guard)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, changed_cells):
+        """
+        Advance the map revision and drop the plans that pass near a changed cell.
+        :param changed_cells: An iterable of flat indices of cells that changed.
+        """
+        changed = set(changed_cells)
+        with self.lock:
+            self.revision += 1
+            for key in list(self.entries):
+                revision, result, guard = self.entries[key]
+                if guard.isdisjoint(changed):
+                    self.entries[key] = (self.revision, result, guard)
+                else:
+                    del self.entries[key]
+
+    def clear(self):
+        """
+        Advance the map revision and drop every plan, e.g. when the map is resized.
+        """
+        with self.lock:
+            self.revision += 1
+            self.entries.clear()
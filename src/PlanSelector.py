@@ -0,0 +1,150 @@
+from ARAStar import ARAStar
+from AStar import astar_search
+from DStarLite import DStarLite
+from HierarchicalPlanner import HierarchicalPlanner
+from JumpPointSearch import jump_point_search
+from PlanCache import PlanCache
+import Waypoints
+
+# The planners a PlanSelector can run
+MODES = ('astar', 'dstar', 'jps', 'hpa', 'ara')
+
+
+class PlanSelector(object):
+    """
+    Runs the planner picked by its mode on the current map. Repeated plans are
+    answered from a PlanCache until a map change touches them, and the
+    incremental planners are kept between plans and told which cells changed,
+    so a replan only repairs what the change affected.
+    """
+
+    def __init__(self, mode='astar', ara_time_budget=0.5, cache_size=32, shortcut_paths=False):
+        """
+        :param mode: The default planner, one of MODES.
+        :param ara_time_budget: The default seconds the 'ara' planner spends improving a path.
+        :param cache_size: The most plans to keep in the cache.
+        :param shortcut_paths: Whether the robot drives the shortcuts of the
+        paths, see Waypoints.shortcut_path, rather than the paths themselves.
+        """
+        self.mode = mode
+        self.ara_time_budget = ara_time_budget
+        self.shortcut_paths = shortcut_paths
+        self.plan_cache = PlanCache(cache_size)
+        self.costMap = None
+        # The D* Lite planner for the last goal, kept between replans
+        self.incremental_planner = None
+        # The HPA* cluster graph for the current map
+        self.hierarchical_planner = None
+        # The number of cells expanded by the last plan, 0 if it came from the cache
+        self.last_expansions = 0
+        # Whether the last plan came from the cache
+        self.last_cached = False
+        # The cells of the last planned path, by cell index
+        self.last_path = []
+
+    def set_map(self, costMap, same_frame=True):
+        """
+        Plan on a new map from now on.
+        :param costMap: The new CostMap.
+        :param same_frame: Whether the new map has the same origin and
+        resolution as the current one, so that their cells can be compared.
+        :return: An array of the flat indices of the cells whose empty status
+        changed, or None if the maps can't be compared.
+        """
+        changed = None
+        if self.costMap is not None and same_frame:
+            changed = self.costMap.changed_cells(costMap)
+        if changed is None:
+            self.plan_cache.clear()
+        else:
+            self.plan_cache.invalidate(changed)
+        if self.mode == 'hpa':
+            if changed is not None and self.hierarchical_planner is not None and \
+                    self.hierarchical_planner.costMap is self.costMap:
+                # Only the clusters around the changed cells need their entrances found again
+                self.hierarchical_planner.mark_changed(changed.tolist(), costMap)
+            else:
+                self.hierarchical_planner = HierarchicalPlanner(costMap)
+        self.costMap = costMap
+        return changed
+
+    def mark_changed(self, changed):
+        """
+        Record cells of the current map that were changed in place, e.g. by a
+        local map patch.
+        :param changed: A list of flat cell indices.
+        """
+        self.plan_cache.invalidate(changed)
+        if self.incremental_planner is not None and self.incremental_planner.costMap is self.costMap:
+            self.incremental_planner.mark_changed(changed)
+        if self.hierarchical_planner is not None and self.hierarchical_planner.costMap is self.costMap:
+            self.hierarchical_planner.mark_changed(changed)
+
+    def plan(self, start_x, start_y, goal_x, goal_y, mode=None, time_budget=None, progress=None,
+             progress_every=0, on_solution=None):
+        """
+        Plan a path with the given planner, or take it from the cache.
+        :param start_x: The starting X cell on the map.
+        :param start_y: The starting Y cell on the map.
+        :param goal_x: The goal X cell on the map.
+        :param goal_y: The goal Y cell on the map.
+        :param mode: One of MODES. Defaults to the selector's mode.
+        :param time_budget: The seconds the 'ara' planner may spend improving
+        its path. Defaults to the selector's ara_time_budget.
+        :param progress: The 'astar' planner's progress callable, see astar_search.
+        :param progress_every: How many expansions between progress calls.
+        :param on_solution: Called by the 'ara' planner with (path, weight)
+        for each path it finds before it returns, e.g. to send its first path
+        without waiting for the rest.
+        :return: A list of cell indices from the cell after the start to the
+        goal, or None if the goal isn't empty or can't be reached.
+        """
+        costMap = self.costMap
+        if mode is None:
+            mode = self.mode
+        if time_budget is None:
+            time_budget = self.ara_time_budget
+
+        start = costMap.index(start_x, start_y)
+        goal = costMap.index(goal_x, goal_y)
+        revision = self.plan_cache.revision
+        cached = self.plan_cache.get(mode, start, goal)
+        self.last_cached = cached is not None
+        if cached is not None:
+            self.last_expansions = 0
+            # The robot follows this plan now, so map changes are checked against its cells
+            self.last_path = list(cached)
+            return list(cached)
+
+        self.last_expansions = 0
+        if not costMap.empty[goal_y, goal_x]:
+            return None
+        if mode == 'dstar':
+            if self.incremental_planner is None or self.incremental_planner.costMap is not costMap or \
+                    (self.incremental_planner.goal_x, self.incremental_planner.goal_y) != (goal_x, goal_y):
+                self.incremental_planner = DStarLite(costMap, goal_x, goal_y)
+            expansions_before = self.incremental_planner.expansions
+            path = self.incremental_planner.plan(start_x, start_y)
+            self.last_expansions = self.incremental_planner.expansions - expansions_before
+        elif mode == 'jps':
+            path, self.last_expansions = jump_point_search(costMap, start_x, start_y, goal_x, goal_y)
+        elif mode == 'hpa':
+            if self.hierarchical_planner is None or self.hierarchical_planner.costMap is not costMap:
+                self.hierarchical_planner = HierarchicalPlanner(costMap)
+            path, self.last_expansions = self.hierarchical_planner.plan(start_x, start_y, goal_x, goal_y)
+        elif mode == 'ara':
+            planner = ARAStar(costMap, start_x, start_y, goal_x, goal_y)
+            path, weight = planner.run(time_budget, on_solution)
+            self.last_expansions = planner.expansions
+        else:
+            path, self.last_expansions = astar_search(costMap, start_x, start_y, goal_x, goal_y,
+                                                      progress, progress_every)
+        if path is None:
+            return None
+        self.last_path = list(path)
+        guard = self.last_path
+        if self.shortcut_paths:
+            # The straight drives between the corners leave the path, so a change on them invalidates it too
+            guard = guard + Waypoints.shortcut_cells(costMap, costMap.cells(path))
+        self.plan_cache.put(mode, start, goal, revision, list(path), guard, costMap.width, costMap.height)
+        return list(path)
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import deque
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class _PendingRequest(object):
+    """
+    A request that is queued or being planned, shared by every caller that
+    asked for the same thing while it was in flight.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PlanningServer(object):
+    """
+    Runs planning requests on a fixed pool of worker threads. Callers that ask
+    for a request that is already queued or running wait for that one instead
+    of starting another search. Every call's latency is recorded.
+    """
+
+    def __init__(self, workers=2, history=100):
+        """
+        Start the worker threads.
+        :param workers: The number of requests planned at the same time.
+        :param history: How many of the latest latencies to keep for stats.
+        """
+        self.queue = queue.Queue()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=history)
+        self.requests = 0
+        self.coalesced = 0
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name='planning_worker_%d' % i)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def call(self, key, func, timeout=None):
+        """
+        Run a request on the worker pool and wait for its result.
+        :param key: Identifies the request, e.g. its (start, goal) cells.
+        Requests with the same key that overlap share one run of func.
+        :param func: A callable that takes no arguments and returns the result.
+        :param timeout: The most seconds to wait, or None to wait forever.
+        :return: The result of func, or None if the timeout passed first.
+        """
+        start_time = time.time()
+        with self.lock:
+            self.requests += 1
+            pending = self.in_flight.get(key)
+            if pending is None:
+                pending = _PendingRequest()
+                self.in_flight[key] = pending
+                self.queue.put((key, func, pending))
+            else:
+                self.coalesced += 1
+
+        pending.done.wait(timeout)
+        with self.lock:
+            self.latencies.append(time.time() - start_time)
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def stats(self):
+        """
+        Summarize the recent requests.
+        :return: A dict with the request and coalesced counts, the number of
+        requests in flight, and the mean, median, 95th percentile and maximum
+        latency in seconds.
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {'requests': self.requests, 'coalesced': self.coalesced, 'in_flight': len(self.in_flight)}
+        if latencies:
+            stats['mean'] = sum(latencies) / len(latencies)
+            stats['p50'] = latencies[len(latencies) // 2]
+            stats['p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['max'] = latencies[-1]
+        return stats
+
+    def _work(self):
+        while True:
+            key, func, pending = self.queue.get()
+            try:
+                pending.result = func()
+            except Exception as e:
+                pending.error = e
+            finally:
+                with self.lock:
+                    del self.in_flight[key]
+                pending.done.set()
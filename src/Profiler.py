@@ -0,0 +1,155 @@
+import bisect
+import threading
+import time
+
+# Upper bounds of the histogram buckets in seconds, doubling from 10 microseconds to about 3 minutes
+BUCKET_BOUNDS = [0.00001 * 2 ** i for i in range(25)]
+
+
+class Histogram(object):
+    """
+    A running histogram of durations in fixed, doubling buckets, so recording
+    is O(1) in memory and time however many samples arrive.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # The total of the work counts recorded with the durations, e.g. expansions
+        self.work = 0
+
+    def add(self, seconds, work=None):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if work is not None:
+            self.work += work
+
+    def percentile(self, fraction):
+        """
+        :param fraction: The fraction of samples, e.g. 0.95.
+        :return: The upper bound of the bucket that sample falls in, at most the maximum.
+        """
+        rank = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(BUCKET_BOUNDS[i], self.max) if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+class Profiler(object):
+    """
+    Records how long callbacks and the stages inside them take, how long
+    messages waited before their callback ran, and optionally how much work a
+    stage did. Every record goes into a running histogram per name and, when
+    a trace file is given, onto one buffered line of the file.
+    """
+
+    def __init__(self, trace_path=None, clock=time.time):
+        """
+        :param trace_path: A file to write every record to, or None for no trace.
+        :param clock: A callable returning the current time in the same clock
+        as message stamps, e.g. rospy.get_time so sim time works.
+        """
+        self.clock = clock
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.trace = open(trace_path, 'a', 1 << 16) if trace_path else None
+
+    def record(self, name, seconds, work=None):
+        """
+        Record one sample.
+        :param name: What was timed, e.g. 'astar'.
+        :param seconds: How long it took.
+        :param work: Optional count of the work done, e.g. cells expanded.
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds, work)
+            if self.trace is not None:
+                self.trace.write('%.6f\t%s\t%.6f\t%s\n' % (time.time(), name, seconds, '' if work is None else work))
+
+    def timed(self, name):
+        """
+        Time a block of code:
+
+            with profiler.timed('astar') as stage:
+                path, stage.work = astar_search(...)
+
+        :param name: What is being timed.
+        :return: A context manager whose work attribute may be set inside the block.
+        """
+        return _Stage(self, name)
+
+    def wrap(self, name, callback):
+        """
+        Time every call of a callback. If its first argument has a
+        header.stamp, the time it waited before the callback ran is recorded
+        as name + '.lag'.
+        :param name: The name to record the calls under.
+        :param callback: The callback to time.
+        :return: The timed callback.
+        """
+        def timed_callback(msg, *args):
+            stamp = getattr(getattr(msg, 'header', None), 'stamp', None)
+            if stamp is not None and stamp.to_sec() > 0:
+                self.record(name + '.lag', self.clock() - stamp.to_sec())
+            start = time.time()
+            try:
+                return callback(msg, *args)
+            finally:
+                self.record(name, time.time() - start)
+        return timed_callback
+
+    def summary(self):
+        """
+        Summarize everything recorded so far and flush the trace file.
+        :return: A dict by name of dicts with the count, calls per second,
+        mean, p50, p95 and max seconds, and work per second if work was recorded.
+        """
+        with self.lock:
+            if self.trace is not None:
+                self.trace.flush()
+            elapsed = max(time.time() - self.started, 1e-9)
+            summary = {}
+            for name, histogram in self.histograms.items():
+                stats = {'count': histogram.count, 'per_second': histogram.count / elapsed,
+                         'mean': histogram.total / histogram.count, 'p50': histogram.percentile(0.5),
+                         'p95': histogram.percentile(0.95), 'max': histogram.max}
+                if histogram.work:
+                    stats['work_per_second'] = histogram.work / max(histogram.total, 1e-9)
+                summary[name] = stats
+            return summary
+
+    def close(self):
+        """
+        Flush and close the trace file.
+        """
+        with self.lock:
+            if self.trace is not None:
+                self.trace.close()
+                self.trace = None
+
+
+class _Stage(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.work = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, time.time() - self.start, self.work)
+        return False
@@ -0,0 +1,70 @@
+import numpy
+
+
+class Region(object):
+    """
+    A rectangle of grid cells, the cells with x0 <= x < x1 and y0 <= y < y1.
+    Used to pass around the part of a map that changed.
+    """
+
+    def __init__(self, x0, y0, x1, y1):
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+
+    @classmethod
+    def from_mask(cls, mask):
+        """
+        :param mask: A (height, width) boolean array.
+        :return: The smallest Region holding every True cell, or None if there are none.
+        """
+        rows = numpy.flatnonzero(mask.any(axis=1))
+        if len(rows) == 0:
+            return None
+        columns = numpy.flatnonzero(mask.any(axis=0))
+        return cls(int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1)
+
+    @property
+    def width(self):
+        return self.x1 - self.x0
+
+    @property
+    def height(self):
+        return self.y1 - self.y0
+
+    @property
+    def slices(self):
+        """
+        :return: A tuple of (row slice, column slice) selecting the region
+        from a (height, width) array, e.g. costMap.empty[region.slices].
+        """
+        return slice(self.y0, self.y1), slice(self.x0, self.x1)
+
+    def grow(self, margin, width, height):
+        """
+        :param margin: How many cells to grow each side by.
+        :param width: The width of the map, the region is kept on it.
+        :param height: The height of the map.
+        :return: A new Region grown by margin on every side and clipped to the map.
+        """
+        return Region(max(self.x0 - margin, 0), max(self.y0 - margin, 0),
+                      min(self.x1 + margin, width), min(self.y1 + margin, height))
+
+    def union(self, other):
+        """
+        :param other: Another Region, or None.
+        :return: The smallest Region holding both.
+        """
+        if other is None:
+            return self
+        return Region(min(self.x0, other.x0), min(self.y0, other.y0), max(self.x1, other.x1), max(self.y1, other.y1))
+
+    def __eq__(self, other):
+        return isinstance(other, Region) and (self.x0, self.y0, self.x1, self.y1) == (other.x0, other.y0, other.x1, other.y1)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Region(%d, %d, %d, %d)' % (self.x0, self.y0, self.x1, self.y1)
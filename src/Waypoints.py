@@ -0,0 +1,235 @@
+import math
+
+
+def get_waypoints(path, geometry):
+    """
+    Get path waypoints from a list of cells defining the path from the start
+    to the end of navigation. A waypoint is placed wherever the path turns.
+    :param path: A list of cells defining the path.
+    :param geometry: The MapGeometry of the map the path is on.
+    :return: A list of (x, y, yaw) waypoints in the world frame.
+    """
+    waypoints = []
+    direction = []
+    changeX = 0
+    changeY = 0
+    # checking if the robot changes direction along the path
+    for i in range(1, len(path)):
+        newdX = path[i].getXpos() - path[i - 1].getXpos()
+        newdY = path[i].getYpos() - path[i - 1].getYpos()
+        # if the robot does change direction, record the direction it was facing,
+        # and record the position the robot was at
+        if newdX != changeX or newdY != changeY:
+            direction.append(get_direction(changeX, changeY))
+            waypoints.append(path[i - 1])
+        changeX = newdX
+        changeY = newdY
+    # also record the last position of the robot
+    direction.append(get_direction(changeX, changeY))
+    waypoints.append(path[len(path) - 1])
+    return [geometry.to_world(cell.getXpos(), cell.getYpos()) + (yaw,) for cell, yaw in zip(waypoints, direction)]
+
+
+def get_local_waypoints(path, geometry, spacing=1.0):
+    """
+    Get path waypoints from a list of cells defining the path from the start
+    to the end of navigation. The waypoints are broken up into smaller chunks
+    to make it easier for the robot to navigate and re-plan.
+    :param path: A list of cells defining the path.
+    :param geometry: The MapGeometry of the map the path is on.
+    :param spacing: The longest straight run between waypoints, in meters.
+    :return: A list of (x, y, yaw) waypoints in the world frame.
+    """
+    waypoints = []
+    direction = []
+    changeX = 0
+    changeY = 0
+    distance = 0
+    # checking if the robot changes direction along the path
+    for i in range(1, len(path)):
+        newdX = path[i].getXpos() - path[i - 1].getXpos()
+        newdY = path[i].getYpos() - path[i - 1].getYpos()
+        # if the robot does change direction, record the direction it was facing,
+        # and record the position the robot was at
+        if newdX != changeX or newdY != changeY:
+            direction.append(get_direction(changeX, changeY))
+            waypoints.append(path[i - 1])
+        else:
+            distance += geometry.resolution
+            if distance >= spacing:
+                direction.append(direction[-1])
+                waypoints.append(path[i])
+                distance = 0
+        changeX = newdX
+        changeY = newdY
+    # also record the last position of the robot
+    direction.append(get_direction(changeX, changeY))
+    waypoints.append(path[len(path) - 1])
+    return [geometry.to_world(cell.getXpos(), cell.getYpos()) + (yaw,) for cell, yaw in zip(waypoints, direction)]
+
+
+def get_shortcut_waypoints(path, geometry, costMap):
+    """
+    Get path waypoints from a list of cells defining the path from the start
+    to the end of navigation, keeping only the cells where the path has to
+    turn to stay clear of obstacles, so each waypoint is a straight drive
+    from the last.
+    :param path: A list of cells defining the path.
+    :param geometry: The MapGeometry of the map the path is on.
+    :param costMap: The inflated CostMap the path was planned on.
+    :return: A list of (x, y, yaw) waypoints in the world frame, each facing
+    along the segment that reaches it.
+    """
+    corners = shortcut_path(costMap, path)
+    waypoints = []
+    for i, cell in enumerate(corners):
+        # The first waypoint faces the second, the rest face the way they were reached
+        if i > 0:
+            previous, following = corners[i - 1], cell
+        elif len(corners) > 1:
+            previous, following = cell, corners[1]
+        else:
+            previous, following = cell, cell
+        yaw = math.atan2(following.getYpos() - previous.getYpos(), following.getXpos() - previous.getXpos())
+        waypoints.append(geometry.to_world(cell.getXpos(), cell.getYpos()) + (yaw,))
+    return waypoints
+
+
+def shortcut_path(costMap, path):
+    """
+    Collapse a path of adjacent cells into the cells where it turns, by
+    pulling the path straight wherever there is a clear line of sight. From
+    each kept cell the path is followed for as long as the line back to it
+    stays clear, and the last cell it was clear to is kept next.
+    :param costMap: The CostMap to check lines of sight against.
+    :param path: A list of cells defining the path.
+    :return: The kept cells, in order, always including the first and last.
+    """
+    if len(path) < 3:
+        return list(path)
+    corners = [path[0]]
+    anchor_x, anchor_y = path[0].getXpos(), path[0].getYpos()
+    for i in range(2, len(path)):
+        if not line_of_sight(costMap, anchor_x, anchor_y, path[i].getXpos(), path[i].getYpos()):
+            corners.append(path[i - 1])
+            anchor_x, anchor_y = path[i - 1].getXpos(), path[i - 1].getYpos()
+    corners.append(path[-1])
+    return corners
+
+
+def shortcut_cells(costMap, path):
+    """
+    Get the cells the robot drives over when it follows the shortcut of a
+    path, which are those on the straight lines between its corners rather
+    than the cells of the path itself.
+    :param costMap: The CostMap the path was planned on.
+    :param path: A list of cells defining the path.
+    :return: A list of the flat indices of the cells on the lines between the
+    cells kept by shortcut_path, in order.
+    """
+    corners = shortcut_path(costMap, path)
+    cells = [costMap.index(corners[0].getXpos(), corners[0].getYpos())] if corners else []
+    for previous, following in zip(corners, corners[1:]):
+        line = line_cells(previous.getXpos(), previous.getYpos(), following.getXpos(), following.getYpos())
+        # Each line starts at the corner the last one ended at
+        cells.extend(costMap.index(x, y) for x, y in line[1:])
+    return cells
+
+
+def line_of_sight(costMap, x0, y0, x1, y1):
+    """
+    Check that every cell on the Bresenham line between two cells is empty.
+    :param costMap: The CostMap to check against.
+    :param x0: The X grid position of the first cell.
+    :param y0: The Y grid position of the first cell.
+    :param x1: The X grid position of the second cell.
+    :param y1: The Y grid position of the second cell.
+    :return: True if the line is clear.
+    """
+    # The same walk as line_cells, stopping at the first blocked cell, since shortcut_path checks a line per path cell
+    empty = costMap.empty
+    dx = abs(x1 - x0)
+    dy = -abs(y1 - y0)
+    step_x = 1 if x0 < x1 else -1
+    step_y = 1 if y0 < y1 else -1
+    error = dx + dy
+    while True:
+        if not empty[y0, x0]:
+            return False
+        if x0 == x1 and y0 == y1:
+            return True
+        doubled = 2 * error
+        if doubled >= dy:
+            error += dy
+            x0 += step_x
+        if doubled <= dx:
+            error += dx
+            y0 += step_y
+
+
+def line_cells(x0, y0, x1, y1):
+    """
+    Get the cells on the Bresenham line between two cells.
+    :param x0: The X grid position of the first cell.
+    :param y0: The Y grid position of the first cell.
+    :param x1: The X grid position of the second cell.
+    :param y1: The Y grid position of the second cell.
+    :return: A list of the (x, y) grid positions on the line, from the first cell to the second.
+    """
+    cells = []
+    dx = abs(x1 - x0)
+    dy = -abs(y1 - y0)
+    step_x = 1 if x0 < x1 else -1
+    step_y = 1 if y0 < y1 else -1
+    error = dx + dy
+    while True:
+        cells.append((x0, y0))
+        if x0 == x1 and y0 == y1:
+            return cells
+        doubled = 2 * error
+        if doubled >= dy:
+            error += dy
+            x0 += step_x
+        if doubled <= dx:
+            error += dx
+            y0 += step_y
+
+
+def get_direction(x, y):
+    """
+    Get the direction from one cell to the next cell.
+    :param x: The change in X coordinates between the previous and current cell.
+    :param y: The change in Y coordinates between the previous and current cell.
+    :return: An angle, the direction from the previous to the current cell.
+    """
+    if x == -1:
+        if y == -1:
+            return 3 * math.pi / 4
+        elif y == 0:
+            return math.pi
+        else:
+            return -3 * math.pi / 4
+    elif x == 0:
+        if y == -1:
+            return math.pi / 2
+        elif y == 0:
+            return 0
+        else:
+            return -math.pi / 2
+    else:
+        if y == -1:
+            return math.pi / 4
+        elif y == 0:
+            return 0
+        else:
+            return -math.pi / 4
+
+
+def yaw_to_quaternion(yaw):
+    """
+    The quaternion of a rotation about Z, the same as
+    tf.transformations.quaternion_from_euler(0, 0, yaw).
+    :param yaw: The angle in radians.
+    :return: A tuple of (x, y, z, w).
+    """
+    return 0.0, 0.0, math.sin(yaw / 2.0), math.cos(yaw / 2.0)
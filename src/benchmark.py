@@ -0,0 +1,226 @@
+#!/usr/bin/python
+"""
+Benchmark the planning and frontier code on the stage maps without ROS.
+
+Each map is loaded the way map_server would publish it, then expand_objects,
+the frontier detection, group_frontiers and astar on seeded random start and
+goal cells are timed. The results are printed as JSON, e.g.
+
+    ./benchmark.py --trials 20 --seed 1 --output results.json
+    ./benchmark.py ../stagemaps/simple_map.yaml
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+import numpy
+
+from AStar import astar_search
+from CostMap import CostMap
+from FreeCellIndex import FreeCellIndex
+from FrontierDetection import expand_objects, find_frontier_cells, find_frontiers, group_frontiers
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+STAGEMAPS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'stagemaps')
+
+
+def read_map_yaml(path):
+    """
+    Read a map_server yaml file. They are flat key: value files, so PyYAML
+    isn't needed.
+    :param path: The path to the yaml file.
+    :return: A dict of its keys, with [a, b, c] values as lists of floats.
+    """
+    info = {}
+    with open(path) as f:
+        for line in f:
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            value = value.strip()
+            if value.startswith('['):
+                value = [float(v) for v in value.strip('[]').split(',')]
+            info[key.strip()] = value
+    return info
+
+
+def read_pgm(path):
+    """
+    Read a binary (P5) 8 bit pgm image.
+    :param path: The path to the image.
+    :return: A (height, width) numpy array of the pixels, top row first.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    # The header is the magic number, width, height and max value, with # comments allowed between them
+    fields = []
+    i = 0
+    while len(fields) < 4:
+        while data[i:i + 1].isspace():
+            i += 1
+        if data[i:i + 1] == b'#':
+            i = data.index(b'\n', i)
+            continue
+        j = i
+        while not data[j:j + 1].isspace():
+            j += 1
+        fields.append(data[i:j])
+        i = j
+    if fields[0] != b'P5' or int(fields[3]) > 255:
+        raise ValueError('%s is not an 8 bit binary pgm' % path)
+    width, height = int(fields[1]), int(fields[2])
+    return numpy.frombuffer(data, dtype=numpy.uint8, count=width * height, offset=i + 1).reshape(height, width)
+
+
+def load_map(yaml_path):
+    """
+    Load a stage map into occupancy data, thresholded like map_server does.
+    :param yaml_path: The path to the map's yaml file.
+    :return: A tuple of the width, height, resolution and row-major
+    occupancy data, with 100 for occupied, 0 for free and -1 for unknown.
+    """
+    info = read_map_yaml(yaml_path)
+    image = read_pgm(os.path.join(os.path.dirname(yaml_path), info['image']))
+    if int(info.get('negate', 0)):
+        occupied = image / 255.0
+    else:
+        occupied = (255 - image) / 255.0
+    data = numpy.full(image.shape, -1, dtype=numpy.int8)
+    data[occupied > float(info['occupied_thresh'])] = 100
+    data[occupied < float(info['free_thresh'])] = 0
+    # Images are stored top row first, occupancy grids bottom row first
+    data = numpy.flipud(data)
+    return image.shape[1], image.shape[0], float(info['resolution']), data.ravel()
+
+
+def measure(setup, stage):
+    """
+    Time one run of a stage, then run it again to find its peak memory.
+    Without tracemalloc, e.g. on python 2, the memory is how far the second
+    run raised the process' peak resident size instead. That only counts what
+    the stage needed beyond the highest peak so far, so it is a lower bound
+    and is often 0 for stages smaller than an earlier one.
+    :param setup: A callable returning the stage's argument, run untimed.
+    :param stage: A callable taking the argument.
+    :return: A tuple of the stage's result and a dict of its seconds and
+    either its peak bytes allocated or its peak resident size growth in
+    kilobytes, whichever could be measured, with the other None.
+    """
+    arg = setup()
+    start = time.time()
+    result = stage(arg)
+    stats = {'seconds': time.time() - start, 'peak_bytes': None, 'rss_growth_kb': None}
+    arg = setup()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        stage(arg)
+        stats['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stage(arg)
+        stats['rss_growth_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    return result, stats
+
+
+def summarize(trials, key):
+    values = sorted(trial[key] for trial in trials if trial[key] is not None)
+    if not values:
+        return None
+    return {'total': sum(values), 'mean': sum(values) / float(len(values)),
+            'median': values[len(values) // 2], 'max': values[-1]}
+
+
+def detect_frontiers(costMap):
+    """
+    Find the frontiers and their centroids the way frontier_node does.
+    :param costMap: The inflated CostMap.
+    :return: A list of (Frontier, centroid cell) tuples.
+    """
+    free_cells = FreeCellIndex(costMap)
+    return [(group, group.get_centroid(free_cells)) for group in find_frontiers(costMap)]
+
+
+def benchmark_map(yaml_path, trials, seed):
+    """
+    Run every stage on one map.
+    :param yaml_path: The path to the map's yaml file.
+    :param trials: The number of astar start and goal pairs.
+    :param seed: The seed the start and goal cells are picked with.
+    :return: A dict of the map's size and the results of each stage.
+    """
+    width, height, resolution, data = load_map(yaml_path)
+    result = {'map': os.path.basename(yaml_path), 'width': width, 'height': height, 'resolution': resolution}
+    stages = result['stages'] = {}
+
+    stages['expand_objects'] = measure(lambda: CostMap(width, height, data), expand_objects)[1]
+    costMap = CostMap(width, height, data)
+    expand_objects(costMap)
+
+    groups, stages['detect_frontiers'] = measure(lambda: costMap, detect_frontiers)
+    stages['detect_frontiers']['frontiers'] = len(groups)
+
+    cells = find_frontier_cells(costMap)
+    frontiers, stages['group_frontiers'] = measure(lambda: list(cells), group_frontiers)
+    stages['group_frontiers']['cells'] = len(cells)
+    stages['group_frontiers']['groups'] = len(frontiers)
+
+    # Plan between known empty cells of the inflated map
+    free = numpy.flatnonzero((costMap.empty & ~costMap.unknown).ravel())
+    rand = random.Random(seed)
+    runs = []
+    for i in range(trials if len(free) else 0):
+        start, goal = int(free[rand.randrange(len(free))]), int(free[rand.randrange(len(free))])
+        (path, expansions), stats = measure(
+            lambda: costMap, lambda c: astar_search(c, start % width, start // width, goal % width, goal // width))
+        stats.update({'start': [start % width, start // width], 'goal': [goal % width, goal // width],
+                      'expansions': expansions, 'path_length': None if path is None else len(path)})
+        runs.append(stats)
+    stages['astar'] = {'trials': runs, 'seconds': summarize(runs, 'seconds'),
+                       'expansions': summarize(runs, 'expansions'), 'peak_bytes': summarize(runs, 'peak_bytes'),
+                       'rss_growth_kb': summarize(runs, 'rss_growth_kb')}
+
+    # ru_maxrss is in kilobytes on Linux and never goes down, so it is the peak up to this map
+    result['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the planning and frontier code on the stage maps.')
+    parser.add_argument('maps', nargs='*', help='map yaml files, all of stagemaps/*.yaml by default')
+    parser.add_argument('--trials', type=int, default=10, help='astar start and goal pairs per map')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the start and goal cells')
+    parser.add_argument('--output', help='write the JSON here instead of to stdout')
+    args = parser.parse_args()
+
+    maps = args.maps or sorted(glob.glob(os.path.join(STAGEMAPS, '*.yaml')))
+    results = []
+    for yaml_path in maps:
+        sys.stderr.write('Benchmarking %s\n' % yaml_path)
+        try:
+            results.append(benchmark_map(yaml_path, args.trials, args.seed))
+        except (IOError, OSError, ValueError) as e:
+            sys.stderr.write('Skipping %s: %s\n' % (yaml_path, e))
+            results.append({'map': os.path.basename(yaml_path), 'error': str(e)})
+
+    report = {'python': platform.python_version(), 'trials': args.trials, 'seed': args.seed, 'maps': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,18 @@
 #!/usr/bin/python
-import math
 import random
 
 import actionlib
 import rospy
 import tf
 from actionlib_msgs.msg import GoalID, GoalStatusArray
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
 from geometry_msgs.msg import Point, PoseStamped
 from move_base_msgs.msg import MoveBaseAction, MoveBaseGoal
 from nav_msgs.msg import GridCells, Odometry
-from GridCell import GridCell
+from CellPoints import CellPoints
+from FrontierDetection import INFLATION_RADIUS, FrontierMap
+from MapGeometry import MapGeometry
+from Profiler import Profiler
 from nav_msgs.srv import GetMap
 from tf.transformations import euler_from_quaternion, quaternion_from_euler
 
@@ -17,47 +20,14 @@ CELL_WIDTH = 0.3
 CELL_HEIGHT = 0.3
 expanded_cells = []
 wall_cells = []
+# Builds wall_cells from the map, reusing the Points while the walls don't change
+wall_points = CellPoints(lambda x, y: Point(x, y, 0))
+# The inflated map and its frontier cells, updated where each new map differs from the last
+frontier_map = FrontierMap()
 path_cells = []
 frontier_cells = []
-
-
-def get_centroid(frontier):
-    x_sum, y_sum = 0.0, 0.0
-    total = len(frontier)
-
-    for cell in frontier:
-        x_sum = x_sum + cell.getXpos()
-        y_sum = y_sum + cell.getYpos()
-
-    cell_x = int(x_sum / total)
-    cell_y = int(y_sum / total)
-
-    cell = costMap[cell_x][cell_y]
-
-    if not cell.isEmpty() or cell.isUnknown():
-        cell = get_closest_valid_cell(cell)
-
-    return cell
-
-
-def get_closest_valid_cell(cell):
-    unexplored = []
-    explored = [cell]
-
-    unexplored.extend(get_neighboring_cells(cell))
-
-    while True:
-        tmp = unexplored.pop(0)
-
-        if tmp in explored:
-            continue
-
-        explored.append(tmp)
-
-        if tmp.isEmpty() and not tmp.isUnknown():
-            return tmp
-        else:
-            unexplored.extend(get_neighboring_cells(tmp))
+# Timings of the callbacks and frontier stages, summarized on /diagnostics
+profiler = Profiler()
 
 
 def detect_frontiers():
@@ -66,29 +36,35 @@ def detect_frontiers():
     :return: A list of frontiers, where each frontier is a list of connected frontier cells
     """
     global nav_goal, unreachable, centroids, done
-    frontier = []
-
-    # Iterate through all of the cells in the global map and collect all the possible frontier cells
-    for row in costMap:
-        for cell in row:
-            if is_frontier_cell(cell):
-                frontier.append(cell)
 
-    # Group the frontier cells into continuous frontiers and return them as a list
-    groups = group_frontiers(frontier)
-
-    groups = filter(lambda l: longest_distance(l) >= 10, groups)
+    # Collect the frontier cells of the global map and group them into continuous frontiers
+    with profiler.timed('find_frontiers'):
+        groups = frontier_map.find_frontiers()
 
     for frontier in groups:
-        for cell in frontier:
+        for cell in frontier.gridCells:
             publish_cell(cell.getXpos(), cell.getYpos(), "frontier")
     for i in range(10):
         publish_cells()
 
-    # Calculate the centroid of all of the frontiers
-    centroids = map(get_centroid, groups)
-
-    if len(centroids) == 0:  # If there are no centroids, quit.
+    # Calculate the centroid of all of the frontiers, snapped to the closest known empty cell
+    free_cells = frontier_map.free_cells()
+    centroids = [frontier.get_centroid(free_cells) for frontier in groups]
+    # There is nowhere to drive to if the map has no known empty cells
+    groups = [groups[i] for i in range(len(groups)) if centroids[i] is not None]
+    centroids = [centroid for centroid in centroids if centroid is not None]
+
+    # Calculate the path distance to each centroid and drop the ones that can't be reached
+    with profiler.timed('distances_to_centroids'):
+        distances = distances_to_centroids(centroids)
+    reachable = [i for i in range(len(centroids)) if distances[i] is not None]
+    if len(reachable) != len(centroids):
+        print "Ignoring " + str(len(centroids) - len(reachable)) + " unreachable frontiers."
+    groups = [groups[i] for i in reachable]
+    centroids = [centroids[i] for i in reachable]
+    distances = [distances[i] for i in reachable]
+
+    if len(centroids) == 0:  # If there are no reachable centroids, quit.
         print '*****************DONE*****************'
         cancel_navigation()
         done = True
@@ -100,10 +76,7 @@ def detect_frontiers():
     publish_cells()
 
     # Calculate the number of frontier cells in each frontier
-    lengths = map(len, groups)
-
-    # Calculate the distance to each centroid
-    distances = map(distance_to_centroid, centroids)
+    lengths = [frontier.size for frontier in groups]
 
     # Weight each centroid by its distance * # of frontier cells
     weighted_centroid = []
@@ -141,75 +114,18 @@ def detect_frontiers():
         publish_cells()
 
 
-def distance_to_centroid(centroid_cell):
-    cell_x, cell_y = map_to_grid(x, y)
-    return math.sqrt((centroid_cell.getXpos() - cell_x) ** 2 + (centroid_cell.getYpos() - cell_y) ** 2)
-
-
-def get_neighboring_cells(cell):
+def distances_to_centroids(centroids):
     """
-    :param cell: The cell, whose neighbors are needed
-    :return: A list of cells neightobring cell
+    Calculate the path distance from the robot to every centroid with one
+    expansion over the inflated costMap.
+    :param centroids: A list of centroid cells.
+    :return: A list of distances in cells, None where a centroid is unreachable.
     """
-    neighbors = []
-
-    x_pos = cell.getXpos()
-    y_pos = cell.getYpos()
-
-    # Iterate through the 8 adjacent cells
-    for row in range(y_pos - 1, y_pos + 2):
-        for col in range(x_pos - 1, x_pos + 2):
-            # Filter out bad cells
-            if row < 0 or col < 0 or (row == y_pos and col == x_pos):
-                continue
-            else:
-                try:
-                    neighbors.append(costMap[col][row])
-                except:  # Index out of bounds exception
-                    pass
-
-    return neighbors
-
-
-def has_known_neighbor(neighbors):
-    for cell in neighbors:
-        if not cell.isUnknown():
-            return True
-
-    return False
-
-
-def is_frontier_cell(cell):
-    return cell.isUnknown() and has_known_neighbor(filter(lambda c: c.isEmpty(), get_neighboring_cells(cell)))
-
-
-def group_frontiers(ungrouped_frontier):
-    frontiers = []
-
-    while len(ungrouped_frontier) != 0:
-        frontier = [ungrouped_frontier.pop(0)]
-        done = False
-
-        # Just ask Tucker what's going on here
-        while not done:
-            try:
-                for a in ungrouped_frontier:
-                    for b in frontier:
-                        if is_adjacent(a, b):
-                            frontier.append(a)
-                            ungrouped_frontier.remove(a)
-                            raise StopIteration  # Using this to break out of outer for loop
-                # Finished finding the frontier. Add it to the frontiers list.
-                done = True
-                frontiers.append(frontier)
-            except:  # Using this as a break loop statement
-                pass
-
-    return frontiers
-
-
-def is_adjacent(a, b):
-    return (abs(a.getXpos() - b.getXpos()) <= 1) and (abs(a.getYpos() - b.getYpos()) <= 1)
+    cell_x, cell_y = map_to_grid(x, y)
+    targets = [costMap.index(cell.getXpos(), cell.getYpos()) for cell in centroids]
+    # The robot may be inside an inflated obstacle, so let it drive out of anything below a real obstacle
+    costs = costMap.path_distances(cell_x, cell_y, targets, escape_level=90)
+    return [None if cost is None else cost / 10.0 for cost in costs]
 
 
 def odom_handler(msg):
@@ -232,15 +148,6 @@ def odom_handler(msg):
         x_cell, y_cell = map_to_grid(x, y)
     except:
         pass
-def longest_distance(frontier):
-    max_dist = 0
-
-    for a in frontier:
-        for b in frontier:
-            dist = math.sqrt((a.getXpos() - b.getXpos())**2 + (a.getYpos() - b.getYpos())**2)
-            if dist > max_dist:
-                max_dist = dist
-    return max_dist
 
 
 def request_map(event):
@@ -248,7 +155,7 @@ def request_map(event):
     Request a map from the costmap service.
     """
     get_map_srv = rospy.ServiceProxy('/dynamic_map', GetMap)
-    map_handler(get_map_srv().map)
+    profiler.wrap('map_handler', map_handler)(get_map_srv().map)
 
 
 def map_handler(msg):
@@ -259,7 +166,7 @@ def map_handler(msg):
     print "******************************Got global map******************************"
     global CELL_WIDTH, CELL_HEIGHT
     global map_width, map_height, occupancyGrid, x_offset, y_offset
-    global map_origin_x, map_origin_y, costMap
+    global map_origin_x, map_origin_y, costMap, geometry
     global path_cells, wall_cells, frontier_cells, expanded_cells
 
     map_width = msg.info.width
@@ -274,38 +181,20 @@ def map_handler(msg):
     y_offset = msg.info.origin.position.y - (2 * CELL_HEIGHT)
     map_origin_x = msg.info.origin.position.x
     map_origin_y = msg.info.origin.position.y
+    geometry = MapGeometry.from_map_info(msg.info)
     print "Map origin: ", map_origin_x, map_origin_y
 
-    # Create the costMap
-    costMap = [[0 for j in range(map_height)] for j in range(map_width)]
-
-    count = 0
-    # iterating through every position in the matrix
-    # OccupancyGrid is in row-major order
-    # Items in rows are displayed in contiguous memory
+    # Update the costMap where the map changed, OccupancyGrid is in row-major order
     path_cells, wall_cells, frontier_cells, expanded_cells = [], [], [], []
-    for y_tmp in range(0, map_height):  # Rows
-        for x_tmp in range(0, map_width):  # Columns
-            costMap[x_tmp][y_tmp] = GridCell(x_tmp, y_tmp, occupancyGrid[count])  # creates all the gridCells
-            count += 1
-    expand_objects()
-    publish_walls()
-    detect_frontiers()
-
-
-def expand_objects():
-    global costMap
-    for y_tmp in range(0, map_height):  # Rows
-        for x_tmp in range(0, map_width):  # Columns
-            if costMap[x_tmp][y_tmp].getOccupancyLevel() > 90:
-                for y_tmp_2 in range (y_tmp - 5, y_tmp + 6):
-                    for x_tmp_2 in range (x_tmp - 5, x_tmp + 6):
-                        if math.sqrt((y_tmp_2 - y_tmp)**2 + (x_tmp_2 - x_tmp)**2) > 5:
-                            continue
-                        try:
-                            costMap[x_tmp_2][y_tmp_2].setOccupancyLevel(60)
-                        except IndexError:
-                            pass
+    with profiler.timed('update_map') as stage:
+        changed = frontier_map.update(geometry, map_width, map_height, occupancyGrid)
+        stage.work = 0 if changed is None else changed.width * changed.height
+    costMap = frontier_map.costMap
+    print "Changed cells: ", changed
+    with profiler.timed('publish_walls'):
+        publish_walls()
+    with profiler.timed('detect_frontiers'):
+        detect_frontiers()
 
 
 def map_to_grid(global_x, global_y):
@@ -315,9 +204,7 @@ def map_to_grid(global_x, global_y):
     :param global_y: The global Y coordinate.
     :return: A tuple representing the X, Y coordinate on the grid.
     """
-    grid_x = int(math.floor((global_x - map_origin_x) / CELL_WIDTH))
-    grid_y = int(math.floor((global_y - map_origin_y) / CELL_HEIGHT))
-    return grid_x, grid_y
+    return geometry.to_grid(global_x, global_y)
 
 
 def map_to_world(grid_x, grid_y):
@@ -327,9 +214,7 @@ def map_to_world(grid_x, grid_y):
     :param grid_y: The grid Y position.
     :return: A tuple representing the X, Y coordinate in the world frame.
     """
-    global_x = (grid_x * CELL_WIDTH + map_origin_x) + (CELL_WIDTH / 2)
-    global_y = (grid_y * CELL_WIDTH + map_origin_y) + (CELL_HEIGHT / 2)
-    return global_x, global_y
+    return geometry.to_world(grid_x, grid_y)
 
 
 def publish_cell(x_position, y_position, state):
@@ -391,11 +276,7 @@ def publish_walls():
     """
     global pub_walls, costMap, wall_cells
 
-    wall_cells = []
-    for y_tmp in range(0, map_height):
-        for x_tmp in range(0, map_width):
-            if not costMap[x_tmp][y_tmp].isEmpty():
-                publish_cell(x_tmp, y_tmp, 'wall')
+    wall_cells = wall_points.update(~costMap.empty, geometry)
 
     # Information all GridCells messages will use
     msg = GridCells()
@@ -439,6 +320,24 @@ def publish_frontier():
     pub_frontier.publish(msg)
 
 
+def publish_diagnostics(event):
+    """
+    Publish a summary of the callback and stage timings on /diagnostics.
+    :param event: The rospy.Timer event.
+    """
+    status = DiagnosticStatus()
+    status.level = DiagnosticStatus.OK
+    status.name = 'rbe_3002_frontier_node: timing'
+    status.message = 'Seconds per call and calls per second'
+    for name, stats in sorted(profiler.summary().items()):
+        for key, value in sorted(stats.items()):
+            status.values.append(KeyValue(name + ' ' + key, '%.6g' % value))
+    msg = DiagnosticArray()
+    msg.header.stamp = rospy.Time.now()
+    msg.status.append(status)
+    pub_diagnostics.publish(msg)
+
+
 def nav_to_pose(goal):
     """
     Drive to a goal subscribed to from /move_base_simple/goal
@@ -500,8 +399,14 @@ def go_to_next_centroid():
 
 if __name__ == '__main__':
     global odom_list, pub_walls, pub_expanded, pub_path, pub_frontier, last_map, move_base_cancel
-    global goal_done, unreachable, nav_goal, done
+    global goal_done, unreachable, nav_goal, done, pub_diagnostics
     rospy.init_node('rbe_3002_frontier_node')
+    # Timings are written to ~trace_file as well when it is set
+    profiler = Profiler(rospy.get_param('~trace_file', '') or None, rospy.get_time)
+    # Obstacles are inflated by ~inflation_radius cells, and known empty cells get a cost that falls off over
+    # ~inflation_falloff cells past that
+    frontier_map = FrontierMap(rospy.get_param('~inflation_radius', INFLATION_RADIUS),
+                               rospy.get_param('~inflation_falloff', 0))
     goal_done = True
     unreachable = False
     nav_goal = None
@@ -512,12 +417,13 @@ if __name__ == '__main__':
     pub_expanded = rospy.Publisher('/expanded_cells', GridCells, queue_size=1)
     pub_path = rospy.Publisher('/path_cells', GridCells, queue_size=1)
     pub_frontier = rospy.Publisher('/frontier_cells', GridCells, queue_size=1)
+    pub_diagnostics = rospy.Publisher('/diagnostics', DiagnosticArray, queue_size=1)
 
     # Subscribe to Odometry changes
-    rospy.Subscriber('/odom', Odometry, odom_handler)
+    rospy.Subscriber('/odom', Odometry, profiler.wrap('odom_handler', odom_handler))
 
     # Subscribe to the navgoal.
-    rospy.Subscriber('/navgoal', PoseStamped, nav_to_pose)
+    rospy.Subscriber('/navgoal', PoseStamped, profiler.wrap('nav_to_pose', nav_to_pose))
 
     # Create Odemetry listener and boadcaster
     odom_list = tf.TransformListener()
@@ -526,7 +432,8 @@ if __name__ == '__main__':
     move_base = actionlib.SimpleActionClient('move_base', MoveBaseAction)
     move_base.wait_for_server(rospy.Duration(5))
     # Subscribe to move base status.
-    move_base_status = rospy.Subscriber('/move_base/status', GoalStatusArray, move_status_handler)
+    move_base_status = rospy.Subscriber('/move_base/status', GoalStatusArray,
+                                        profiler.wrap('move_status_handler', move_status_handler))
 
     # Request the global costmap every 5 seconds
     last_map = []
@@ -537,6 +444,8 @@ if __name__ == '__main__':
     request_map(None)
     rospy.sleep(rospy.Duration(5))
     go_to_next_centroid()
-    rospy.Timer(rospy.Duration(5), request_map)
+    rospy.Timer(rospy.Duration(5), profiler.wrap('request_map', request_map))
+    # Summarize the timings every ~diagnostics_period seconds
+    rospy.Timer(rospy.Duration(rospy.get_param('~diagnostics_period', 5.0)), publish_diagnostics)
 
     rospy.spin()
@@ -1,40 +1,124 @@
 #!/usr/bin/python
+import math
+import threading
+
 import actionlib
 import rospy
+from actionlib_msgs.msg import GoalStatus
 from move_base_msgs.msg import MoveBaseAction, MoveBaseGoal
 from nav_msgs.msg import Path
-from std_msgs.msg import Bool
+from rbe3002.msg import MovementState
 
 wheel_rad = 3.5 / 100.0  # cm
 wheel_base = 23.0 / 100.0  # cm
 
+# The next waypoint is sent once the robot is this many meters from the current one
+lookahead_radius = 0.3
+# The waypoints of the path being driven, and the one being driven to
+path_poses = []
+goal_index = 0
+# When the path and the current waypoint were started
+path_start = None
+goal_start = None
+# Where move_base last reported the robot, None until it does
+robot_position = None
+# Guards the path between the /nav_path callback and follow_path
+path_lock = threading.Lock()
+
+# States in which move_base has stopped driving to a waypoint without reaching it
+FAILED_STATES = (GoalStatus.PREEMPTED, GoalStatus.ABORTED, GoalStatus.REJECTED, GoalStatus.RECALLED, GoalStatus.LOST)
+
 
-def send_move_status(msg):
+def send_move_status(moving, goal_time=None):
     """
     Send a movement status message.
-    :param msg: A bool, true if moving, false if stopped.
+    :param moving: True if moving, false if stopped.
+    :param goal_time: How long the waypoint just reached took, as a rospy.Duration.
     """
     global move_status_pub
-    status_msg = Bool()
-    status_msg.data = msg
+    status_msg = MovementState()
+    status_msg.moving = moving
+    status_msg.goal_index = goal_index
+    status_msg.goal_count = len(path_poses)
+    if goal_time is not None:
+        status_msg.goal_time = goal_time
+    if path_start is not None:
+        status_msg.path_time = rospy.Time.now() - path_start
     move_status_pub.publish(status_msg)
 
 
 def nav_path_handler(path_msg):
     """
-    Navigate along a path.
+    Start navigating along a path, replacing the one being driven.
     :param path_msg: The path to navigate along.
     """
+    global path_poses, goal_index, path_start
     print "Got path! ", path_msg
-    send_move_status(True)
-    for p in path_msg.poses:
-        nav_to_pose(p)
-    send_move_status(False)
+    with path_lock:
+        if path_poses:
+            print "Preempting the current path"
+        path_poses = list(path_msg.poses)
+        goal_index = 0
+        path_start = rospy.Time.now()
+        if not path_poses:
+            move_base.cancel_all_goals()
+            send_move_status(False)
+            return
+        # Sending a new goal preempts the one move_base is driving to
+        send_current_goal()
+        send_move_status(True)
+
+
+def follow_path(event):
+    """
+    Stream the path to move_base. The next waypoint is sent as soon as the
+    robot is within lookahead_radius of the current one, so the robot doesn't
+    stop at each of them. The path ends when the last waypoint is reached or
+    move_base gives up on one.
+    :param event: The rospy.Timer event.
+    """
+    global path_poses, goal_index
+    with path_lock:
+        if not path_poses:
+            return
+        state = move_base.get_state()
+        last = goal_index == len(path_poses) - 1
+        if state == GoalStatus.SUCCEEDED or (not last and near(path_poses[goal_index])):
+            goal_time = rospy.Time.now() - goal_start
+            print "Reached waypoint", goal_index, "in", goal_time.to_sec(), "s"
+            if last:
+                send_move_status(False, goal_time)
+                path_poses = []
+            else:
+                goal_index += 1
+                send_current_goal()
+                send_move_status(True, goal_time)
+        elif state in FAILED_STATES:
+            print "move_base gave up on waypoint", goal_index
+            send_move_status(False)
+            path_poses = []
+
+
+def near(pose):
+    """
+    :param pose: A PoseStamped waypoint.
+    :return: True if the robot is within lookahead_radius of the waypoint.
+    """
+    if robot_position is None:
+        return False
+    position = pose.pose.position
+    return math.hypot(position.x - robot_position.x, position.y - robot_position.y) < lookahead_radius
+
+
+def send_current_goal():
+    global goal_start
+    goal_start = rospy.Time.now()
+    nav_to_pose(path_poses[goal_index])
 
 
 def nav_to_pose(goal):
     """
-    Drive to a goal subscribed to from /move_base_simple/goal
+    Send a goal to move_base without waiting for it to be reached.
     :param goal: Goal pose.
     """
     global move_base
@@ -42,21 +126,32 @@ def nav_to_pose(goal):
     goal_pose.target_pose.header.frame_id = 'map'
     goal_pose.target_pose.header.stamp = rospy.Time.now()
     goal_pose.target_pose.pose = goal.pose
-    move_base.send_goal(goal_pose)
-    success = move_base.wait_for_result(rospy.Duration(60))
+    move_base.send_goal(goal_pose, feedback_cb=move_base_feedback_handler)
+
+
+def move_base_feedback_handler(feedback):
+    """
+    Track the robot's position as move_base reports it.
+    :param feedback: The MoveBaseFeedback message.
+    """
+    global robot_position
+    robot_position = feedback.base_position.pose.position
 
 
 def main():
     """
     The main program function.
     """
-    global move_status_pub, move_base
+    global move_status_pub, move_base, lookahead_radius
     rospy.init_node('rbe3002_move_node')
+    lookahead_radius = rospy.get_param('~lookahead_radius', lookahead_radius)
 
-    rospy.Subscriber('/nav_path', Path, nav_path_handler)
-    move_status_pub = rospy.Publisher('/movement_state', Bool, queue_size=1)
+    move_status_pub = rospy.Publisher('/movement_state', MovementState, queue_size=1)
     move_base = actionlib.SimpleActionClient("move_base", MoveBaseAction)
     move_base.wait_for_server(rospy.Duration(5))
+    # Only the newest path matters, it preempts any older one
+    rospy.Subscriber('/nav_path', Path, nav_path_handler, queue_size=1)
+    rospy.Timer(rospy.Duration(1.0 / rospy.get_param('~follow_rate', 10.0)), follow_path)
 
     rospy.spin()
 
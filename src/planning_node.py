@@ -1,12 +1,23 @@
 #!/usr/bin/python
-import math
+import threading
+import time
 import rospy
 import tf
-from GridCell import GridCell
+from AStar import astar_search
+from CellPoints import CellPoints
+from CostMap import CostMap
+from GoalFollower import GoalFollower
+from MapGeometry import MapGeometry
+from PlanSelector import PlanSelector
+from PlanningServer import PlanningServer
+from Profiler import Profiler
+import Waypoints
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
 from geometry_msgs.msg import Point, PoseStamped, _Quaternion, Quaternion
 from nav_msgs.msg import Odometry, OccupancyGrid, GridCells, Path
-from std_msgs.msg import Bool
-from tf.transformations import euler_from_quaternion, quaternion_from_euler
+from rbe3002.msg import MovementState
+from rbe3002.srv import aStar
+from tf.transformations import euler_from_quaternion
 
 DEBUG = 0
 CELL_WIDTH = 0.3
@@ -17,9 +28,30 @@ wheel_base = 23.0 / 100.0  # cm
 
 expanded_cells = []
 wall_cells = []
+# Builds wall_cells from the map, reusing the Points while the walls don't change
+wall_points = CellPoints(lambda x, y: Point(x, y, 0))
 path_cells = []
 frontier_cells = []
 
+# Send only the corners of a path as waypoints instead of every turn and meter
+shortcut_paths = True
+# Runs the planner picked by ~planner: 'astar', the incremental 'dstar', jump point search 'jps',
+# the hierarchical 'hpa' or the anytime 'ara', and keeps recent plans until a map change touches them
+planner = PlanSelector(shortcut_paths=shortcut_paths)
+# Decides when goal_loop plans and which waypoints go to move_node, created by main
+follower = None
+# The map planners run on, created by map_handler
+costMap = None
+# Where costMap lies in the world
+geometry = None
+# Timings of the callbacks and planning stages, summarized on /diagnostics
+profiler = Profiler()
+
+# Publish astar's search progress every this many expansions, 0 turns it off
+search_viz_every = 100
+# The most times per second astar's search progress is published, 0 or less publishes it every search_viz_every
+search_viz_rate = 5.0
+
 
 def odom_handler(msg):
     """Odometry callback function.
@@ -49,7 +81,7 @@ def goal_handler(msg):
     :param msg: The new desired pose (in the world frame) from Rviz.
     """
     db_print('goalHandler')
-    global goal_x, goal_y, goal_theta, x_goal_cell, y_goal_cell, path_cells, expanded_cells, frontier_cells, is_moving
+    global goal_x, goal_y, goal_theta, x_goal_cell, y_goal_cell, path_cells, expanded_cells, frontier_cells
     pose = msg.pose
 
     # Set the goal_x, goal_y, and goal_theta variables
@@ -73,34 +105,65 @@ def goal_handler(msg):
     publish_expanded()
     publish_frontier()
 
-    pose_tmp = PoseStamped()
-    pose_tmp.pose.position.x = x
-    pose_tmp.pose.position.y = y
-    pose_tmp.pose.orientation.z = theta
-    path_msg = Path()
-    path_msg.header.frame_id = 'map'
-    path_msg.poses.append(pose_tmp)
-    pub_path.publish(path_msg)
-
-    path_done = False
-    while not path_done:
-        print 'Reached waypoint, replanning...'
-        if abs(x_goal_cell - x_cell) < 5 and abs(y_goal_cell - y_cell) < 5:
-            path_done = True
-        path_cells = []
-        expanded_cells = []
-        frontier_cells = []
-        path = astar(x_cell, y_cell, x_goal_cell, y_goal_cell)
-        new_path_msg = Path()
-        new_path_msg.header.frame_id = 'map'
-        if len(path.poses) > 1:
-            new_path_msg.poses.append(path.poses[1])
-        else:
-            new_path_msg.poses.append(path.poses[0])
-        pub_path.publish(new_path_msg)
-        publish_cells()
-        while is_moving:
-            pass
+    # goal_loop plans and sends the waypoints, so this callback returns straight away
+    follower.set_goal(x_goal_cell, y_goal_cell)
+
+
+def goal_loop():
+    """
+    Drive to the goal. Runs on its own thread and sleeps until follower is
+    asked to replan, so no callback thread ever waits for the robot.
+    """
+    while not rospy.is_shutdown():
+        events = follower.wait(1.0)
+        if not events or not follower.active:
+            continue
+        print 'Replanning for', ', '.join(sorted(events))
+        try:
+            outcome = follower.handle(events, x_cell, y_cell)
+        except Exception as e:
+            # Keep the thread alive, e.g. when no odometry or map has arrived yet
+            print 'Planning failed:', e
+            continue
+        if outcome == 'reached':
+            print 'Reached goal'
+        elif outcome == 'no path':
+            print 'No path to goal, waiting for the map to change'
+
+
+def plan_leg(x_cell, y_cell, x_goal_cell, y_goal_cell, on_solution):
+    """
+    Plan the next leg to the goal for follower and show it in rviz.
+    :param x_cell: The starting X cell on the map.
+    :param y_cell: The starting Y cell on the map.
+    :param x_goal_cell: The goal X cell on the map.
+    :param y_goal_cell: The goal Y cell on the map.
+    :param on_solution: Called with the waypoints of each path the 'ara' planner finds before it returns.
+    :return: A list of PoseStamped waypoints, empty at the goal, or None if there is no path.
+    """
+    global path_cells, expanded_cells, frontier_cells
+    path_cells = []
+    expanded_cells = []
+    frontier_cells = []
+    path = plan_path(x_cell, y_cell, x_goal_cell, y_goal_cell,
+                     on_solution=lambda path_msg: on_solution(path_msg.poses))
+    publish_cells()
+    if path is None:
+        return None
+    return path.poses
+
+
+def publish_waypoints(poses):
+    """
+    Send the waypoints of a planned path to move_node on /nav_path, which
+    drives through them and replaces any path it was driving.
+    :param poses: A list of PoseStamped waypoints.
+    """
+    new_path_msg = Path()
+    new_path_msg.header.frame_id = 'map'
+    # The first waypoint is next to the robot, unless it is the goal
+    new_path_msg.poses.extend(poses[1:] or poses)
+    pub_path.publish(new_path_msg)
 
 
 def map_handler(msg):
@@ -112,8 +175,9 @@ def map_handler(msg):
     db_print('mapHandler')
     global expanded_cells, frontier_cells, unexplored_cells, CELL_WIDTH, CELL_HEIGHT
     global map_width, map_height, occupancyGrid, x_offset, y_offset
-    global map_origin_x, map_origin_y, costMap
+    global map_origin_x, map_origin_y, costMap, geometry, wall_cells
 
+    old_geometry = geometry
     map_width = msg.info.width
     map_height = msg.info.height
     occupancyGrid = msg.data
@@ -126,34 +190,26 @@ def map_handler(msg):
     y_offset = msg.info.origin.position.y - (2 * CELL_HEIGHT)
     map_origin_x = msg.info.origin.position.x
     map_origin_y = msg.info.origin.position.y
+    geometry = MapGeometry.from_map_info(msg.info)
     print "Map origin: ", map_origin_x, map_origin_y
 
-    for y in range(0, map_height):
-        for x in range(0, map_width):
-            index = y * map_width + x
-            if occupancyGrid[index] > 30:
-                publish_cell(x, y, 'wall')
-    publish_walls()
+    # Create the costMap, OccupancyGrid is in row-major order
+    with profiler.timed('map_handler.costmap'):
+        costMap = CostMap(map_width, map_height, occupancyGrid)
+        # Cached plans and planner state are only dropped where the cells changed
+        changed = planner.set_map(costMap, old_geometry == geometry)
 
-    # Create the costMap
-    costMap = [[0 for x in range(map_height)] for x in range(map_width)]
+    # Every cell of a fresh map over 30 is a wall, which is every cell that isn't empty
+    with profiler.timed('map_handler.walls'):
+        wall_cells = wall_points.update(~costMap.empty, geometry)
+        publish_walls()
 
-    count = 0
-    # iterating through every position in the matrix
-    # OccupancyGrid is in row-major order
-    # Items in rows are displayed in contiguous memory
-    for y in range(0, map_height):  # Rows
-        for x in range(0, map_width):  # Columns
-            costMap[x][y] = GridCell(x, y, occupancyGrid[count])  # creates all the gridCells
-            count += 1
-
-    try:
-        if (x_goal_cell != x_cell) and (y_goal_cell != y_cell):
+    if follower.active:
+        # While the robot drives a path only a change to it needs a new one
+        if changed is None or not follower.moving or not set(planner.last_path).isdisjoint(changed.tolist()):
             print "Not at goal, re-planning..."
-            print 'Goal ', x_goal_cell, y_goal_cell
-            print 'Start ', x_cell, y_cell
-            astar(x_cell, y_cell, x_goal_cell, y_goal_cell)
-    except NameError:
+            follower.request('map')
+    else:
         print "No goal yet."
 
 
@@ -174,23 +230,29 @@ def local_map_handler(msg):
 
     local_origin_x = msg.info.origin.position.x
     local_origin_y = msg.info.origin.position.y
+    changed = []
+    if costMap is None:
+        print "Map not ready yet."
+        return
     try:
         (position, orientation) = odom_list.lookupTransform('odom', 'map', rospy.Time(0))
         local_origin_x += position[0]
         local_origin_y += position[1]
         # print "Map origin: ", local_origin_x, local_origin_y
 
-        # iterating through every position in the matrix
-        # OccupancyGrid is in row-major order
-        # Items in rows are displayed in contiguous memory
-        count = 0
-        x_cell_start, y_cell_start = map_to_grid(local_origin_x, local_origin_y)
-        for y in range(y_cell_start, y_cell_start + local_map_height):  # Rows
-            for x in range(x_cell_start, x_cell_start + local_map_width):  # Columns
-                costMap[x][y].setOccupancyLevel(local_occupancy_grid[count]) # update gridCells based on local map
-                count += 1
-    except:
+        # Write the local map over the global one in one slice, clipped to the global map
+        local_geometry = MapGeometry(local_origin_x, local_origin_y, msg.info.resolution)
+        _, changed = costMap.write_patch(local_occupancy_grid, local_map_width, local_map_height,
+                                         local_geometry, geometry)
+        changed = changed.tolist()
+    except (tf.LookupException, tf.ConnectivityException, tf.ExtrapolationException):
         print "Map not ready yet."
+    finally:
+        # Let the incremental planners repair their state around the changed cells
+        planner.mark_changed(changed)
+        # Only replan when the path being driven is affected
+        if follower.active and changed and not set(planner.last_path).isdisjoint(changed):
+            follower.request('map')
 
 
 def map_to_grid(global_x, global_y):
@@ -200,9 +262,7 @@ def map_to_grid(global_x, global_y):
     :param global_y: The global Y coordinate.
     :return: A tuple representing the X, Y coordinate on the grid.
     """
-    grid_x = int(math.floor((global_x - map_origin_x) / CELL_WIDTH))
-    grid_y = int(math.floor((global_y - map_origin_y) / CELL_HEIGHT))
-    return grid_x, grid_y
+    return geometry.to_grid(global_x, global_y)
 
 
 def map_to_world(grid_x, grid_y):
@@ -212,9 +272,7 @@ def map_to_world(grid_x, grid_y):
     :param grid_y: The grid Y position.
     :return: A tuple representing the X, Y coordinate in the world frame.
     """
-    global_x = (grid_x * CELL_WIDTH + map_origin_x) + (CELL_WIDTH / 2)
-    global_y = (grid_y * CELL_WIDTH + map_origin_y) + (CELL_HEIGHT / 2)
-    return global_x, global_y
+    return geometry.to_world(grid_x, grid_y)
 
 
 def publish_cell(x, y, state):
@@ -261,7 +319,7 @@ def publish_expanded():
     Publishes the information stored in expanded_cells to the map
     """
     db_print('publishExpanded')
-    pub_expanded = rospy.Publisher('/expanded_cells', GridCells, queue_size=1)
+    global pub_expanded
 
     # Information all GridCells messages will use
     msg = GridCells()
@@ -278,7 +336,7 @@ def publish_walls():
     Publishes the information stored in frontier_cells to the map
     """
     db_print('publishWalls')
-    pub_frontier = rospy.Publisher('/wall_cells', GridCells, queue_size=1)
+    global pub_walls
 
     # Information all GridCells messages will use
     msg = GridCells()
@@ -287,7 +345,7 @@ def publish_walls():
     msg.cell_height = CELL_HEIGHT
 
     msg.cells = wall_cells
-    pub_frontier.publish(msg)
+    pub_walls.publish(msg)
 
 
 def publish_path():
@@ -295,7 +353,7 @@ def publish_path():
     Publishes the information stored in unexplored_cells to the map
     """
     db_print('publishPath')
-    pub_unexplored = rospy.Publisher('/path_cells', GridCells, queue_size=1)
+    global pub_path_cells
 
     # Information all GridCells messages will use
     msg = GridCells()
@@ -304,7 +362,7 @@ def publish_path():
     msg.cell_height = CELL_HEIGHT
 
     msg.cells = path_cells
-    pub_unexplored.publish(msg)
+    pub_path_cells.publish(msg)
 
 
 def publish_frontier():
@@ -312,7 +370,7 @@ def publish_frontier():
     Publishes the information stored in unexplored_cells to the map
     """
     db_print('publishFrontier')
-    pub_unexplored = rospy.Publisher('/frontier_cells', GridCells, queue_size=1)
+    global pub_frontier
 
     # Information all GridCells messages will use
     msg = GridCells()
@@ -321,7 +379,25 @@ def publish_frontier():
     msg.cell_height = CELL_HEIGHT
 
     msg.cells = frontier_cells
-    pub_unexplored.publish(msg)
+    pub_frontier.publish(msg)
+
+
+def publish_search_progress(opened, closed):
+    """
+    Publishes search progress, the given open cells as expanded and the
+    given closed cells as frontier.
+    :param opened: A list of cell indices on the open list.
+    :param closed: A list of cell indices on the closed list.
+    """
+    global expanded_cells, frontier_cells
+    expanded_cells = []
+    frontier_cells = []
+    for index in opened:
+        publish_cell(index % map_width, index // map_width, 'expanded')
+    for index in closed:
+        publish_cell(index % map_width, index // map_width, 'frontier')
+    publish_expanded()
+    publish_frontier()
 
 
 def db_print(param):
@@ -333,64 +409,60 @@ def db_print(param):
         print param
 
 
-def astar(x_cell, y_cell, x_goal_cell, y_goal_cell):
+def search_progress():
     """
-    Complete the A* path planning algorithm on the globally stored map.
-    :param x_cell: The starting X cell on the map.
-    :param y_cell: The starting Y cell on the map.
-    :param x_goal_cell: The goal X cell on the map.
-    :param y_goal_cell: The goal Y cell on the map.
-    :return: The path from the starting pose to the ending pose planned by the algorithm.
+    :return: A progress callable for astar_search that publishes the search as
+    it goes, at most search_viz_rate times a second.
     """
-    global frontier_cells, expanded_cells
+    # Every cell handed to progress so far, and when it last published
+    all_opened = []
+    all_closed = []
+    last_publish = [0]
 
-    goal_cell = costMap[x_goal_cell][y_goal_cell]
-    if not goal_cell.isEmpty():
-        print "No thanks"
-        return
+    def progress(opened, closed, final):
+        # Only stream the cells opened and closed since the last publish
+        if not final and search_viz_rate > 0 and time.time() - last_publish[0] < 1.0 / search_viz_rate:
+            return False
+        all_opened.extend(opened)
+        all_closed.extend(closed)
+        if final:
+            # Finish with one full picture of the search
+            closed_set = set(all_closed)
+            publish_search_progress([n for n in set(all_opened) if n not in closed_set], all_closed)
+        else:
+            publish_search_progress(opened, closed)
+        last_publish[0] = time.time()
+        return True
 
-    # Keep track of explored cells
-    open_list = []
-    # Keep track of cells with parents
-    closed_list = []
-    # Keep track of path
-    path = []
-
-    # make the start position the selected cell
-    selected_cell = costMap[x_cell][y_cell]
-
-    for y in range(0, map_height):  # Rows
-        for x in range(0, map_width):  # Columns
-            costMap[x][y].setH(x_goal_cell, y_goal_cell)  # adds an H value to every gridCell
-
-    while selected_cell != costMap[x_goal_cell][y_goal_cell]:
-        closed_list.append(selected_cell)
-        neighbors = unexplored_neighbors(selected_cell, open_list, closed_list, costMap)
-        open_list.extend(neighbors)
-        open_list.sort(key=lambda candidate: candidate.getFval())
-        selected_cell = open_list[0]
-        open_list.remove(selected_cell)
-        frontier_cells = []
-        expanded_cells = []
-        for cell in open_list:
-            if cell not in closed_list:
-                publish_cell(cell.getXpos(), cell.getYpos(), 'expanded')
-        for cell in closed_list:
-            publish_cell(cell.getXpos(), cell.getYpos(), 'frontier')
-        publish_expanded()
-        publish_frontier()
-
-    path_cell = selected_cell
-    while path_cell != costMap[x_cell][y_cell]:
-        path.append(path_cell)
-        path_cell = path_cell.getParent()
-    path = list(reversed(path))
-    print path
-    # Publish path
-    waypoints = get_local_waypoints(path)
+    return progress
+
+
+def make_path_msg(path, grid=None, grid_geometry=None):
+    """
+    Turn a planned path into a message of its waypoints.
+    :param path: A list of GridCells from the cell after the start to the goal.
+    :param grid: The CostMap the path was planned on, costMap by default.
+    :param grid_geometry: The MapGeometry of that map, geometry by default.
+    :return: A nav_msgs/Path message containing the waypoints of the path.
+    """
     path_msg = Path()
     path_msg.header.frame_id = 'map'
-    path_msg.poses.extend(waypoints)
+    if path:
+        if shortcut_paths:
+            path_msg.poses.extend(get_shortcut_waypoints(path, grid or costMap, grid_geometry))
+        else:
+            path_msg.poses.extend(get_local_waypoints(path, grid_geometry))
+    return path_msg
+
+
+def path_to_msg(path):
+    """
+    Turn a planned path into waypoints and publish its cells.
+    :param path: A list of GridCells from the cell after the start to the goal.
+    :return: A nav_msgs/Path message containing the waypoints of the path.
+    """
+    print path
+    path_msg = make_path_msg(path)
     # pub_path.publish(path_msg)
     publish_expanded()
     publish_frontier()
@@ -401,68 +473,109 @@ def astar(x_cell, y_cell, x_goal_cell, y_goal_cell):
     return path_msg
 
 
-def unexplored_neighbors(selectedCell, openList, closedList, costMap):
-    """
-    Returns a list of all of the unexplored neighbors of a given cell. This method
-    also sets all of the neighbor cells parents to the selected cell.
-    :param selectedCell: The cell to search for neighbors of.
-    :param openList: The open list from A*.
-    :param closedList: The closed list from A*.
-    :param costMap: The global costmap.
-    :return: A list of GridCells containing the eligible neighbor candidates.
-    """
-    neighbors_tmp = []
-    neighbors = []
-    neighbors_tmp.append(costMap[selectedCell.getXpos() + 1][selectedCell.getYpos()])
-    neighbors_tmp.append(costMap[selectedCell.getXpos()][selectedCell.getYpos() + 1])
-    neighbors_tmp.append(costMap[selectedCell.getXpos() - 1][selectedCell.getYpos()])
-    neighbors_tmp.append(costMap[selectedCell.getXpos()][selectedCell.getYpos() - 1])
-    neighbors_tmp.append(costMap[selectedCell.getXpos() - 1][selectedCell.getYpos() - 1])
-    neighbors_tmp.append(costMap[selectedCell.getXpos() + 1][selectedCell.getYpos() + 1])
-    neighbors_tmp.append(costMap[selectedCell.getXpos() - 1][selectedCell.getYpos() + 1])
-    neighbors_tmp.append(costMap[selectedCell.getXpos() + 1][selectedCell.getYpos() - 1])
-    for n in neighbors_tmp:
-        if (n != selectedCell) and (n not in openList) and (n not in closedList) and n.isEmpty():
-            n.setParent(selectedCell)
-            neighbors.append(n)
-    return neighbors
+def plan_path(x_cell, y_cell, x_goal_cell, y_goal_cell, mode=None, time_budget=None, on_solution=None):
+    """
+    Plan a path with the given planner and report how many cells it expanded.
+    Repeated plans are answered from planner's cache until a map change touches them.
+    :param x_cell: The starting X cell on the map.
+    :param y_cell: The starting Y cell on the map.
+    :param x_goal_cell: The goal X cell on the map.
+    :param y_goal_cell: The goal Y cell on the map.
+    :param mode: 'astar', 'dstar', 'jps', 'hpa' or 'ara'. Defaults to the ~planner parameter.
+    :param time_budget: The seconds the 'ara' planner may spend improving its
+    path. Defaults to the ~ara_time_budget parameter.
+    :param on_solution: Called with each path message the 'ara' planner finds
+    before it returns, e.g. to send its first path without waiting for the rest.
+    :return: The path from the starting pose to the ending pose planned by the algorithm.
+    """
+    if mode is None:
+        mode = planner.mode
+    progress = search_progress() if mode == 'astar' and search_viz_every else None
+
+    def on_improved(path, weight):
+        global path_cells
+        print 'ARA* found a path within', weight, 'times the shortest'
+        path_cells = []
+        path_msg = path_to_msg(costMap.cells(path))
+        if on_solution is not None:
+            on_solution(path_msg)
+
+    started = time.time()
+    path = planner.plan(x_cell, y_cell, x_goal_cell, y_goal_cell, mode, time_budget,
+                        progress, search_viz_every, on_improved)
+    if planner.last_cached:
+        print mode, 'plan cache hit'
+    else:
+        profiler.record(mode, time.time() - started, planner.last_expansions)
+        print mode, 'expanded', planner.last_expansions, 'cells'
+    if path is None:
+        print "No path to goal"
+        return
+    return path_to_msg(costMap.cells(path))
 
 
 def astar_handler(req):
     """
-    Handles A* requests that come in on the A* service.
+    Handles A* requests that come in on the A* service. rospy calls this from
+    one thread per request. The search itself runs on planning_server's worker
+    pool against a snapshot of the map, and identical requests that arrive
+    while one is being planned share its result.
     :param req: The service request.
-    :return: A path planned by the A* algorithm.
+    :return: A path planned by the A* algorithm, with no poses if there is none.
     """
-    global goal_x, goal_y, goal_theta, x_goal_cell, y_goal_cell, path_cells, expanded_cells, frontier_cells
-    start_pose = req.startPose.pose
-    goal_pose = req.endPose.pose
-
-    # Set the goal_x, goal_y, and goal_theta variables
-    quat = goal_pose.orientation
-    q = [quat.x, quat.y, quat.z, quat.w]
-    roll, pitch, yaw = euler_from_quaternion(q)
-
-    goal_x = goal_pose.position.x
-    goal_y = goal_pose.position.y
-    goal_theta = yaw
-
-    x_cell = int((start_pose.position.x - 2 * CELL_WIDTH) // CELL_WIDTH)
-    y_cell = int(start_pose.position.y // CELL_WIDTH)
-
-    x_goal_cell = int((goal_x - 2 * CELL_WIDTH) // CELL_WIDTH)
-    y_goal_cell = int(goal_y // CELL_WIDTH)
+    if costMap is None:
+        print "Map not ready yet."
+        return make_path_msg([])
+
+    x_cell, y_cell = map_to_grid(req.startPose.pose.position.x, req.startPose.pose.position.y)
+    x_goal_cell, y_goal_cell = map_to_grid(req.endPose.pose.position.x, req.endPose.pose.position.y)
+    if not (costMap.in_bounds(x_cell, y_cell) and costMap.in_bounds(x_goal_cell, y_goal_cell)):
+        print "A* service request is off the map"
+        return make_path_msg([])
+
+    path_msg = planning_server.call((x_cell, y_cell, x_goal_cell, y_goal_cell),
+                                    lambda: plan_on_snapshot(x_cell, y_cell, x_goal_cell, y_goal_cell))
+    stats = planning_server.stats()
+    print 'A* service: %d requests, %d coalesced, latency mean %.3fs p95 %.3fs max %.3fs' % (
+        stats['requests'], stats['coalesced'], stats['mean'], stats['p95'], stats['max'])
+    return path_msg
 
-    print 'Goal ', x_goal_cell, y_goal_cell
 
-    path_cells = []
-    expanded_cells = []
-    frontier_cells = []
-    publish_path()
-    publish_expanded()
-    publish_frontier()
-
-    return astar(x_cell, y_cell, x_goal_cell, y_goal_cell)
+def plan_on_snapshot(x_cell, y_cell, x_goal_cell, y_goal_cell):
+    """
+    Plan with A* on a private copy of the current map, so that several
+    searches can run at once without sharing planner state. Repeated queries
+    are answered from planner's cache, which goal_loop's astar plans share.
+    :param x_cell: The starting X cell on the map.
+    :param y_cell: The starting Y cell on the map.
+    :param x_goal_cell: The goal X cell on the map.
+    :param y_goal_cell: The goal Y cell on the map.
+    :return: A nav_msgs/Path message, with no poses if there is no path.
+    """
+    # Taken before the snapshot, so a plan on a map that changes meanwhile is not cached
+    plan_cache = planner.plan_cache
+    revision = plan_cache.revision
+    start = costMap.index(x_cell, y_cell)
+    goal = costMap.index(x_goal_cell, y_goal_cell)
+    cached = plan_cache.get('astar', start, goal)
+    if cached is not None:
+        return make_path_msg(costMap.cells(cached))
+
+    # Keep the geometry the snapshot was taken with, in case a new map arrives while planning
+    snapshot_geometry = geometry
+    snapshot = costMap.copy()
+    if not snapshot[x_goal_cell][y_goal_cell].isEmpty():
+        return make_path_msg([])
+    with profiler.timed('astar_service') as stage:
+        path, stage.work = astar_search(snapshot, x_cell, y_cell, x_goal_cell, y_goal_cell)
+    if path is None:
+        return make_path_msg([])
+    path_msg = make_path_msg(snapshot.cells(path), snapshot, snapshot_geometry)
+    guard = list(path)
+    if shortcut_paths:
+        guard += Waypoints.shortcut_cells(snapshot, snapshot.cells(path))
+    plan_cache.put('astar', start, goal, revision, list(path), guard, snapshot.width, snapshot.height)
+    return path_msg
 
 
 def get_waypoints(path):
@@ -470,117 +583,81 @@ def get_waypoints(path):
     Get path waypoints from a list of GridCells defining the path from the
     start to the end of navigation.
     :param path: A list of GridCells defining the path.
-    :return: A nav_msgs/Path message containing extracted the path.
+    :return: A list of PoseStamped waypoints.
     """
-    waypoints = []
-    direction = []
     posePath = []
-    changeX = 0
-    changeY = 0
-    # checking if the robot changes direction along the path
-    for i in range(1, len(path)):
-        newdX = path[i].getXpos() - path[i - 1].getXpos()
-        newdY = path[i].getYpos() - path[i - 1].getYpos()
-        # if the robot does change direction, record the direction it was facing,
-        # and record the position the robot was at
-        if newdX != changeX or newdY != changeY:
-            direction.append(get_direction(changeX, changeY))
-            waypoints.append(path[i - 1])
-        changeX = newdX
-        changeY = newdY
-    # also record the last position of the robot
-    direction.append(get_direction(changeX, changeY))
-    waypoints.append(path[len(path) - 1])
-    # turn all the data into a list poses
-    for i in range(0, len(waypoints)):
+    for x, y, yaw in Waypoints.get_waypoints(path, geometry):
         pose = PoseStamped()
-        pose.pose.position.x, pose.pose.position.y = map_to_world(waypoints[i].getXpos(), waypoints[i].getYpos())
-        pose.pose.orientation.z = direction[i]
+        pose.pose.position.x, pose.pose.position.y = x, y
+        pose.pose.orientation.z = yaw
         posePath.append(pose)
     return posePath
 
 
-def get_local_waypoints(path):
+def get_local_waypoints(path, grid_geometry=None):
     """
     Get path waypoints from a list of GridCells defining the path from the
     start to the end of navigation. The waypoints are broken up into smaller
     chunks to make it easier for the robot to navigate and re-plan.
     :param path: A list of GridCells defining the path.
-    :return: A nav_msgs/Path message containing extracted the path.
+    :param grid_geometry: The MapGeometry of the map the path is on, geometry by default.
+    :return: A list of PoseStamped waypoints.
+    """
+    return waypoints_to_poses(Waypoints.get_local_waypoints(path, grid_geometry or geometry))
+
+
+def get_shortcut_waypoints(path, grid, grid_geometry=None):
+    """
+    Get the waypoints where a path has to turn to stay clear of obstacles, so
+    the robot drives straight between them instead of stopping at every turn.
+    :param path: A list of GridCells defining the path.
+    :param grid: The CostMap the path was planned on.
+    :param grid_geometry: The MapGeometry of that map, geometry by default.
+    :return: A list of PoseStamped waypoints.
+    """
+    return waypoints_to_poses(Waypoints.get_shortcut_waypoints(path, grid_geometry or geometry, grid))
+
+
+def waypoints_to_poses(waypoints):
+    """
+    :param waypoints: A list of (x, y, yaw) waypoints in the map frame.
+    :return: A list of PoseStamped waypoints.
     """
-    waypoints = []
-    direction = []
     posePath = []
-    changeX = 0
-    changeY = 0
-    distance = 0
-    # checking if the robot changes direction along the path
-    for i in range(1, len(path)):
-        newdX = path[i].getXpos() - path[i - 1].getXpos()
-        newdY = path[i].getYpos() - path[i - 1].getYpos()
-        # if the robot does change direction, record the direction it was facing,
-        # and record the position the robot was at
-        if newdX != changeX or newdY != changeY:
-            direction.append(get_direction(changeX, changeY))
-            waypoints.append(path[i - 1])
-        else:
-            distance += CELL_WIDTH
-            if distance >= 1.0:
-                direction.append(direction[-1])
-                waypoints.append(path[i])
-                distance = 0
-        changeX = newdX
-        changeY = newdY
-    # also record the last position of the robot
-    direction.append(get_direction(changeX, changeY))
-    waypoints.append(path[len(path) - 1])
-    # turn all the data into a list poses
-    for i in range(0, len(waypoints)):
+    for x, y, yaw in waypoints:
         pose = PoseStamped()
-        pose.pose.position.x, pose.pose.position.y = map_to_world(waypoints[i].getXpos(), waypoints[i].getYpos())
-        (w, x, y, z) = quaternion_from_euler(0, 0, direction[i])
-        pose.pose.orientation = Quaternion(w, x, y, z)
+        pose.pose.position.x, pose.pose.position.y = x, y
+        pose.pose.orientation = Quaternion(*Waypoints.yaw_to_quaternion(yaw))
         posePath.append(pose)
     return posePath
 
 
-def get_direction(x, y):
+def publish_diagnostics(event):
     """
-    Get the direction from one cell to the next cell.
-    :param x: The change in X coordinates between the previous and current cell.
-    :param y: The change in Y coordinates between the previous and current cell.
-    :return: An angle, the direction from the previous to the current cell.
+    Publish a summary of the callback and stage timings on /diagnostics.
+    :param event: The rospy.Timer event.
     """
-    if x == -1:
-        if y == -1:
-            return 3 * math.pi / 4
-        elif y == 0:
-            return math.pi
-        else:
-            return -3 * math.pi / 4
-    elif x == 0:
-        if y == -1:
-            return math.pi / 2
-        elif y == 0:
-            return 0
-        else:
-            return -math.pi / 2
-    else:
-        if y == -1:
-            return math.pi / 4
-        elif y == 0:
-            return 0
-        else:
-            return -math.pi / 4
+    status = DiagnosticStatus()
+    status.level = DiagnosticStatus.OK
+    status.name = 'rbe3002_planning_node: timing'
+    status.message = 'Seconds per call, calls per second and cells expanded per second'
+    for name, stats in sorted(profiler.summary().items()):
+        for key, value in sorted(stats.items()):
+            status.values.append(KeyValue(name + ' ' + key, '%.6g' % value))
+    msg = DiagnosticArray()
+    msg.header.stamp = rospy.Time.now()
+    msg.status.append(status)
+    pub_diagnostics.publish(msg)
 
 
 def move_state_handler(msg):
     """
     Handle the movement state.
-    :param msg: The state message from the publisher.
+    :param msg: The MovementState message from move_node.
     """
-    global is_moving
-    is_moving = msg.data
+    if msg.goal_time.to_sec() > 0:
+        profiler.record('waypoint', msg.goal_time.to_sec())
+    follower.set_moving(msg.moving)
 
 
 def main():
@@ -588,34 +665,66 @@ def main():
     The main program function.
     """
     db_print('main')
-    global vel_pub, odom_list, pub_path, is_moving
+    global vel_pub, odom_list, pub_path, follower, search_viz_every, search_viz_rate
+    global pub_expanded, pub_walls, pub_path_cells, pub_frontier, planning_server, pub_diagnostics, profiler
+    global shortcut_paths
 
     rospy.init_node('rbe3002_planning_node')
+    planner.mode = rospy.get_param('~planner', planner.mode)
+    search_viz_every = rospy.get_param('~search_viz_every', search_viz_every)
+    search_viz_rate = rospy.get_param('~search_viz_rate', search_viz_rate)
+    planner.plan_cache.size = rospy.get_param('~plan_cache_size', planner.plan_cache.size)
+    planner.ara_time_budget = rospy.get_param('~ara_time_budget', planner.ara_time_budget)
+    shortcut_paths = rospy.get_param('~shortcut_paths', shortcut_paths)
+    planner.shortcut_paths = shortcut_paths
+    # Timings are written to ~trace_file as well when it is set
+    profiler = Profiler(rospy.get_param('~trace_file', '') or None, rospy.get_time)
 
     # Publisher for publishing the navigation path determined by A*
     pub_path = rospy.Publisher('/nav_path', Path, queue_size=1)
 
+    # Publishers for displaying cells in rviz
+    pub_expanded = rospy.Publisher('/expanded_cells', GridCells, queue_size=1)
+    pub_walls = rospy.Publisher('/wall_cells', GridCells, queue_size=1)
+    pub_path_cells = rospy.Publisher('/path_cells', GridCells, queue_size=1)
+    pub_frontier = rospy.Publisher('/frontier_cells', GridCells, queue_size=1)
+
+    # Publisher for the timing summaries
+    pub_diagnostics = rospy.Publisher('/diagnostics', DiagnosticArray, queue_size=1)
+
+    # Plans each leg to the goal and sends its waypoints
+    follower = GoalFollower(plan_leg, publish_waypoints)
+
     # Subscribe to Odometry changes
-    rospy.Subscriber('/odom', Odometry, odom_handler)
+    rospy.Subscriber('/odom', Odometry, profiler.wrap('odom_handler', odom_handler))
 
     # Subscribe to the global map
-    rospy.Subscriber('/move_base/global_costmap/costmap', OccupancyGrid, map_handler)
+    rospy.Subscriber('/move_base/global_costmap/costmap', OccupancyGrid, profiler.wrap('map_handler', map_handler))
 
     # Subscribe to the local map
-    rospy.Subscriber('/move_base/local_costmap/costmap', OccupancyGrid, local_map_handler)
+    rospy.Subscriber('/move_base/local_costmap/costmap', OccupancyGrid,
+                     profiler.wrap('local_map_handler', local_map_handler))
 
     # Subscribe to NavToGoal stuff
-    rospy.Subscriber('/navgoal', PoseStamped, goal_handler)
+    rospy.Subscriber('/navgoal', PoseStamped, profiler.wrap('goal_handler', goal_handler))
 
     # Subscribe to movement status.
-    rospy.Subscriber('movement_state', Bool, move_state_handler)
-    is_moving = False
+    rospy.Subscriber('movement_state', MovementState, profiler.wrap('move_state_handler', move_state_handler))
 
     # Create Odemetry listener and boadcaster 
     odom_list = tf.TransformListener()
 
-    # Create an A* ros service
-    # rospy.Service('A*', aStar, aStarHandler)
+    # Create an A* ros service, planned on a pool of worker threads
+    planning_server = PlanningServer(rospy.get_param('~service_workers', 2))
+    rospy.Service('astar', aStar, profiler.wrap('astar_handler', astar_handler))
+
+    # Summarize the timings every ~diagnostics_period seconds
+    rospy.Timer(rospy.Duration(rospy.get_param('~diagnostics_period', 5.0)), publish_diagnostics)
+
+    # Drive to goals on a thread of our own
+    goal_thread = threading.Thread(target=goal_loop, name='goal_loop')
+    goal_thread.daemon = True
+    goal_thread.start()
 
     publish_expanded()
     publish_frontier()
@@ -0,0 +1,42 @@
+import os
+import sys
+import unittest
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from CellPoints import CellPoints
+from MapGeometry import MapGeometry
+
+
+class CellPointsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.geometry = MapGeometry(0.0, 0.0, 1.0)
+        self.mask = numpy.zeros((3, 4), dtype=bool)
+        self.mask[0, 1] = self.mask[2, 3] = True
+
+    def test_points_at_cell_centers(self):
+        points = CellPoints().update(self.mask, self.geometry)
+        self.assertEqual(points, [self.geometry.to_world(1, 0), self.geometry.to_world(3, 2)])
+
+    def test_kept_points_are_reused(self):
+        made = []
+        cell_points = CellPoints(lambda x, y: made.append((x, y)) or [x, y])
+        first = cell_points.update(self.mask, self.geometry)
+        self.mask[1, 2] = True
+        second = cell_points.update(self.mask, self.geometry)
+        self.assertEqual(len(made), 3)
+        self.assertIs(second[0], first[0])
+        self.assertIs(second[2], first[1])
+
+    def test_new_geometry_makes_new_points(self):
+        cell_points = CellPoints()
+        cell_points.update(self.mask, self.geometry)
+        points = cell_points.update(self.mask, MapGeometry(1.0, 0.0, 1.0))
+        self.assertEqual(points[0], MapGeometry(1.0, 0.0, 1.0).to_world(1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from CostMap import CostMap
+
+LEVELS = {'.': 0, '#': 100, '?': -1, 'o': 60}
+
+
+def map_from_rows(rows):
+    """
+    :param rows: Strings of '.' for empty, '#' for occupied, 'o' for inflated
+    and '?' for unknown cells, bottom row first.
+    :return: A CostMap of the rows.
+    """
+    return CostMap(len(rows[0]), len(rows), [LEVELS[c] for row in rows for c in row])
+
+
+class PathDistancesTest(unittest.TestCase):
+
+    def setUp(self):
+        # Two known rooms split by a thick wall, both open to the unknown space above them
+        self.costMap = map_from_rows(['.....##.....',
+                                      '..o..##.....',
+                                      '.....##.....',
+                                      '????????????',
+                                      '????????????'])
+
+    def test_distances_in_known_space(self):
+        targets = [self.costMap.index(4, 0), self.costMap.index(4, 2), self.costMap.index(0, 0)]
+        self.assertEqual(self.costMap.path_distances(0, 0, targets), [40, 48, 0])
+
+    def test_room_only_reachable_through_unknown_space(self):
+        target = self.costMap.index(8, 1)
+        self.assertEqual(self.costMap.path_distances(0, 0, [target]), [None])
+        self.assertEqual(self.costMap.path_distances(2, 1, [target], escape_level=90), [None])
+
+    def test_escape_from_inflated_start(self):
+        target = self.costMap.index(4, 1)
+        self.assertEqual(self.costMap.path_distances(2, 1, [target], escape_level=90), [20])
+
+    def test_escape_stops_at_closest_known_empty_cells(self):
+        # The start is in unknown space, and only the closest known empty cells may be reached from it
+        target = self.costMap.index(8, 2)
+        self.assertEqual(self.costMap.path_distances(3, 4, [target], escape_level=90), [None])
+        self.assertEqual(self.costMap.path_distances(3, 4, [self.costMap.index(3, 0)], escape_level=90), [40])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from GoalFollower import GoalFollower
+
+
+class GoalFollowerTest(unittest.TestCase):
+
+    def setUp(self):
+        # What the fake planner returns, what it hands to on_solution first, and every list sent
+        self.plans = [['a', 'b', 'goal']]
+        self.solutions = []
+        self.sent = []
+        self.follower = GoalFollower(self.plan, self.sent.append)
+
+    def plan(self, start_x, start_y, goal_x, goal_y, on_solution):
+        for solution in self.solutions:
+            on_solution(solution)
+        return self.plans.pop(0) if len(self.plans) > 1 else self.plans[0]
+
+    def replan(self, start=(0, 0)):
+        return self.follower.handle(self.follower.wait(0), start[0], start[1])
+
+    def test_new_goal_sends_plan(self):
+        self.follower.set_goal(20, 20)
+        self.assertEqual(self.replan(), 'sent')
+        self.assertEqual(self.sent, [['a', 'b', 'goal']])
+        self.assertFalse(self.follower.final_leg)
+
+    def test_nothing_asked(self):
+        self.follower.set_goal(20, 20)
+        self.replan()
+        self.assertEqual(self.follower.wait(0), set())
+        self.assertIsNone(self.follower.handle(set(), 0, 0))
+
+    def test_map_change_while_moving_replaces_plan(self):
+        self.plans = [['a', 'b', 'goal'], ['c', 'goal']]
+        self.follower.set_goal(20, 20)
+        self.replan()
+        self.follower.set_moving(True)
+        self.follower.request('map')
+        self.assertEqual(self.replan((5, 5)), 'sent')
+        self.assertEqual(self.sent, [['a', 'b', 'goal'], ['c', 'goal']])
+
+    def test_map_change_while_stopped_sends(self):
+        self.plans = [None, ['a', 'goal']]
+        self.follower.set_goal(20, 20)
+        self.assertEqual(self.replan(), 'no path')
+        self.follower.request('map')
+        self.assertEqual(self.replan(), 'sent')
+        self.assertEqual(self.sent, [['a', 'goal']])
+
+    def test_arrival_on_final_leg_reaches_goal(self):
+        self.follower.set_goal(2, 2)
+        self.replan()
+        self.assertTrue(self.follower.final_leg)
+        self.follower.set_moving(True)
+        self.follower.set_moving(False)
+        self.assertEqual(self.replan(), 'reached')
+        self.assertFalse(self.follower.active)
+        self.assertEqual(len(self.sent), 1)
+
+    def test_arrival_away_from_goal_replans(self):
+        self.follower.set_goal(20, 20)
+        self.replan()
+        self.follower.set_moving(True)
+        self.follower.set_moving(False)
+        self.assertEqual(self.follower.wait(0), set(['arrived']))
+        self.follower.request('arrived')
+        self.assertEqual(self.replan((10, 10)), 'sent')
+        self.assertEqual(len(self.sent), 2)
+
+    def test_empty_plan_reaches_goal(self):
+        self.plans = [[]]
+        self.follower.set_goal(20, 20)
+        self.assertEqual(self.replan(), 'reached')
+        self.assertEqual(self.sent, [])
+
+    def test_anytime_improvements_replace_plan(self):
+        self.solutions = [['slow'], ['fast']]
+        self.plans = [['fast']]
+        self.follower.set_goal(20, 20)
+        self.follower.set_moving(True)
+        self.follower.request('map')
+        self.assertEqual(self.replan(), 'sent')
+        # The finished plan was the last one found, and isn't sent again
+        self.assertEqual(self.sent, [['slow'], ['fast']])
+
+if __name__ == '__main__':
+    unittest.main()
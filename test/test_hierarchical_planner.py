@@ -0,0 +1,93 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from AStar import astar_search
+from CostMap import CostMap
+from HierarchicalPlanner import HierarchicalPlanner
+
+
+def map_from_rows(rows):
+    """
+    :param rows: Strings of '.' for empty and '#' for occupied cells, bottom row first.
+    :return: A CostMap of the rows.
+    """
+    return CostMap(len(rows[0]), len(rows), [100 if c == '#' else 0 for row in rows for c in row])
+
+
+def path_cost(costMap, path, start):
+    cost = 0
+    x, y = start
+    for cell in path:
+        nx, ny = cell % costMap.width, cell // costMap.width
+        cost += 10 if nx == x or ny == y else 14
+        x, y = nx, ny
+    return cost
+
+
+class HierarchicalPlannerTest(unittest.TestCase):
+
+    def assert_valid_path(self, costMap, path, start, goal):
+        previous = start
+        for x, y in [(cell % costMap.width, cell // costMap.width) for cell in path]:
+            self.assertEqual(max(abs(x - previous[0]), abs(y - previous[1])), 1)
+            self.assertTrue(costMap.empty[y, x])
+            previous = (x, y)
+        self.assertEqual(previous, goal)
+
+    def test_diagonal_border_crossing(self):
+        # The only way between the clusters is a diagonal move across their border
+        costMap = map_from_rows(['....#...', '...#....'])
+        path, _ = HierarchicalPlanner(costMap, cluster_size=4).plan(0, 0, 7, 1)
+        self.assertIsNotNone(path)
+        self.assert_valid_path(costMap, path, (0, 0), (7, 1))
+
+    def test_diagonal_corner_crossing(self):
+        # The only way between the clusters is a diagonal move across the corner they share
+        costMap = map_from_rows(['...#..', '...#..', '..#...', '.#....'])
+        path, _ = HierarchicalPlanner(costMap, cluster_size=2).plan(0, 3, 5, 0)
+        self.assertIsNotNone(path)
+        self.assert_valid_path(costMap, path, (0, 3), (5, 0))
+
+    def test_same_reachability_as_astar(self):
+        rand = random.Random(1)
+        for trial in range(60):
+            width, height = rand.randint(4, 24), rand.randint(4, 24)
+            density = rand.choice([0.2, 0.35, 0.45])
+            costMap = CostMap(width, height, [100 if rand.random() < density else 0 for i in range(width * height)])
+            planner = HierarchicalPlanner(costMap, cluster_size=rand.choice([3, 4, 5, 8]))
+            free = [(x, y) for y in range(height) for x in range(width) if costMap.empty[y, x]]
+            for query in range(10 if free else 0):
+                start, goal = rand.choice(free), rand.choice(free)
+                expected, _ = astar_search(costMap.copy(), start[0], start[1], goal[0], goal[1])
+                path, _ = planner.plan(start[0], start[1], goal[0], goal[1])
+                self.assertEqual(path is None, expected is None, (trial, start, goal))
+                if path is not None:
+                    self.assert_valid_path(costMap, path, start, goal)
+
+    def test_swapped_map_matches_new_planner(self):
+        rand = random.Random(2)
+        for trial in range(30):
+            width, height = rand.randint(4, 24), rand.randint(4, 24)
+            data = [100 if rand.random() < 0.3 else 0 for i in range(width * height)]
+            costMap = CostMap(width, height, data)
+            planner = HierarchicalPlanner(costMap, cluster_size=4)
+            new_costMap = CostMap(width, height, [100 if rand.random() < 0.1 else level for level in data])
+            planner.mark_changed(costMap.changed_cells(new_costMap).tolist(), new_costMap)
+            fresh = HierarchicalPlanner(new_costMap, cluster_size=4)
+            free = [(x, y) for y in range(height) for x in range(width) if new_costMap.empty[y, x]]
+            for query in range(10 if free else 0):
+                start, goal = rand.choice(free), rand.choice(free)
+                path, _ = planner.plan(start[0], start[1], goal[0], goal[1])
+                expected, _ = fresh.plan(start[0], start[1], goal[0], goal[1])
+                self.assertEqual(path is None, expected is None)
+                if path is not None:
+                    self.assertEqual(path_cost(new_costMap, path, start), path_cost(new_costMap, expected, start))
+            self.assertEqual(sorted(planner.borders.items()), sorted(fresh.borders.items()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from CostMap import CostMap
+from PlanSelector import MODES, PlanSelector
+
+
+def map_from_rows(rows):
+    """
+    :param rows: Strings of '.' for empty and '#' for occupied cells, bottom row first.
+    :return: A CostMap of the rows.
+    """
+    return CostMap(len(rows[0]), len(rows), [100 if c == '#' else 0 for row in rows for c in row])
+
+
+ROOM = ['..........',
+        '....#.....',
+        '....#.....',
+        '....#.....',
+        '..........']
+
+
+class PlanSelectorTest(unittest.TestCase):
+
+    def test_modes_agree_on_reachability(self):
+        for mode in MODES:
+            selector = PlanSelector(mode, ara_time_budget=0.05)
+            selector.set_map(map_from_rows(ROOM))
+            path = selector.plan(0, 2, 9, 2)
+            self.assertIsNotNone(path, mode)
+            self.assertEqual(path[-1], selector.costMap.index(9, 2), mode)
+            selector.set_map(map_from_rows(['....#.....'] * 5))
+            self.assertIsNone(selector.plan(0, 2, 9, 2), mode)
+
+    def test_occupied_goal(self):
+        selector = PlanSelector()
+        selector.set_map(map_from_rows(ROOM))
+        self.assertIsNone(selector.plan(0, 2, 4, 2))
+
+    def test_repeated_plan_from_cache(self):
+        selector = PlanSelector()
+        selector.set_map(map_from_rows(ROOM))
+        path = selector.plan(0, 2, 9, 2)
+        self.assertFalse(selector.last_cached)
+        self.assertEqual(selector.plan(0, 2, 9, 2), path)
+        self.assertTrue(selector.last_cached)
+        self.assertEqual(selector.last_expansions, 0)
+        self.assertEqual(selector.last_path, path)
+
+    def test_map_change_on_path_drops_cached_plan(self):
+        selector = PlanSelector()
+        selector.set_map(map_from_rows(ROOM))
+        path = selector.plan(0, 2, 9, 2)
+        # A change away from the path keeps the plan
+        changed = selector.set_map(map_from_rows(['.........#'] + ROOM[1:]))
+        self.assertEqual(changed.tolist(), [selector.costMap.index(9, 0)])
+        self.assertEqual(selector.plan(0, 2, 9, 2), path)
+        self.assertTrue(selector.last_cached)
+        # Closing the gap it went through doesn't
+        selector.set_map(map_from_rows(['.........#'] + ROOM[1:4] + ['....#.....']))
+        replanned = selector.plan(0, 2, 9, 2)
+        self.assertFalse(selector.last_cached)
+        self.assertNotEqual(replanned, path)
+
+    def test_new_frame_clears_cache(self):
+        selector = PlanSelector()
+        selector.set_map(map_from_rows(ROOM))
+        selector.plan(0, 2, 9, 2)
+        self.assertIsNone(selector.set_map(map_from_rows(ROOM), same_frame=False))
+        selector.plan(0, 2, 9, 2)
+        self.assertFalse(selector.last_cached)
+
+    def test_change_on_shortcut_drops_cached_plan(self):
+        open_rows = ['.' * 20] * 10
+        # The path runs along the bottom and then diagonally, its shortcut straight across the middle
+        blocked = open_rows[:4] + ['........#...........'] + open_rows[5:]
+        for shortcut_paths in (False, True):
+            selector = PlanSelector(shortcut_paths=shortcut_paths)
+            selector.set_map(map_from_rows(open_rows))
+            path = selector.plan(0, 0, 19, 9)
+            self.assertNotIn(selector.costMap.index(8, 4), path)
+            selector.set_map(map_from_rows(blocked))
+            selector.plan(0, 0, 19, 9)
+            self.assertEqual(selector.last_cached, not shortcut_paths)
+
+    def test_changed_cells_drop_cached_plan(self):
+        selector = PlanSelector('dstar')
+        selector.set_map(map_from_rows(ROOM))
+        path = selector.plan(0, 2, 9, 2)
+        selector.costMap.empty[path[3] // 10, path[3] % 10] = False
+        selector.mark_changed([path[3]])
+        replanned = selector.plan(0, 2, 9, 2)
+        self.assertFalse(selector.last_cached)
+        self.assertNotIn(path[3], replanned)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from CostMap import CostMap
+import Waypoints
+
+
+class WaypointsTest(unittest.TestCase):
+
+    def test_line_cells(self):
+        self.assertEqual(Waypoints.line_cells(0, 0, 4, 2), [(0, 0), (1, 1), (2, 1), (3, 2), (4, 2)])
+        self.assertEqual(Waypoints.line_cells(2, 3, 2, 1), [(2, 3), (2, 2), (2, 1)])
+        self.assertEqual(Waypoints.line_cells(1, 1, 1, 1), [(1, 1)])
+
+    def test_shortcut_cells_follow_the_corners(self):
+        # An L-shaped room, so the shortcut has to turn at the inside corner
+        costMap = CostMap(5, 5, [0 if x == 0 or y == 4 else 100 for y in range(5) for x in range(5)])
+        path = costMap.cells([costMap.index(0, y) for y in range(5)] + [costMap.index(x, 4) for x in range(1, 5)])
+        cells = Waypoints.shortcut_cells(costMap, path)
+        self.assertEqual(cells, [cell.getYpos() * 5 + cell.getXpos() for cell in path])
+
+    def test_shortcut_cells_cut_across_open_space(self):
+        costMap = CostMap(5, 5, [0] * 25)
+        path = costMap.cells([costMap.index(0, y) for y in range(5)] + [costMap.index(x, 4) for x in range(1, 5)])
+        cells = Waypoints.shortcut_cells(costMap, path)
+        self.assertEqual(cells, [costMap.index(i, i) for i in range(5)])
+
+
+if __name__ == '__main__':
+    unittest.main()